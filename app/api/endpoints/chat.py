@@ -1,120 +1,195 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 from pydantic import BaseModel
+import asyncio
+import logging
 import os
+import re
+import uuid
+import orjson
+from functools import lru_cache
+from itertools import zip_longest
 
 from app.services.chat import ChatService
-from app.models.database import get_db, is_db_available
+from app.models.database import get_optional_db
 from app.models.schemas import ChatRequest, ChatResponse
 from app.services.chat_history import ChatHistoryService
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+def get_chat_service(http_request: Request) -> ChatService:
+    """Dependency returning the shared ChatService created at startup"""
+    chat_service = getattr(http_request.app.state, "chat_service", None)
+    if chat_service is None:
+        detail = getattr(http_request.app.state, "chat_service_error", None) or "Chat service not initialized"
+        raise HTTPException(status_code=500, detail=detail)
+    return chat_service
+
+
+async def _load_chat_context(request: ChatRequest, db: Optional[AsyncSession]):
+    """Resolve the conversation and its chat history for a chat request.
+    
+    Returns ``(db_available, conversation_id, chat_history)``. Creates a new
+    conversation when none is given and falls back to the request's own
+    chat_history when the database can't be used.
+    """
+    # get_optional_db yields None when the database is down
+    db_available = db is not None
+    conversation_id = request.conversation_id
+    chat_history = request.chat_history  # Default to provided history
+    
+    # Only use database if available
+    if db_available:
+        try:
+            history_service = ChatHistoryService(db)
+            
+            # Get or create conversation
+            if not conversation_id:
+                # Create new conversation with title from first message.
+                # A brand-new conversation has no history, so skip loading it.
+                title = history_service.generate_conversation_title(request.message)
+                conversation = await history_service.create_conversation(title=title)
+                conversation_id = conversation.id
+            else:
+                # Get existing messages from database for the conversation
+                try:
+                    existing_messages = await history_service.get_message_contents(conversation_id)
+                    # Convert to chat_history format for LLM context. Messages are
+                    # saved as user/assistant pairs, so even rows are user turns and
+                    # odd rows are the matching assistant replies.
+                    if existing_messages:
+                        chat_history = [
+                            {"user": user_row.content, "assistant": assistant_row.content if assistant_row else None}
+                            for user_row, assistant_row in zip_longest(existing_messages[0::2], existing_messages[1::2])
+                        ]
+                except Exception as e:
+                    logger.warning("Could not load conversation history: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                    # Continue with provided chat_history
+        except (OperationalError, SQLAlchemyError) as e:
+            logger.warning("Database error, continuing without chat history: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            # Continue without database
+            db_available = False
+    
+    return db_available, conversation_id, chat_history
+
+
+async def _load_chat_context_and_embedding(request: ChatRequest, db: Optional[AsyncSession], chat_service: ChatService):
+    """Load the chat context while the query is encoded in the background.
+    
+    Returns ``(db_available, conversation_id, chat_history, query_embedding)``. The
+    query is only encoded if retrieval or the semantic cache will use it, and the
+    embedding is None if the encoder fails.
+    """
+    embed_task = (
+        asyncio.create_task(chat_service.embed_query(request.message))
+        if chat_service.needs_query_embedding else None
+    )
+    try:
+        db_available, conversation_id, chat_history = await _load_chat_context(request, db)
+    except BaseException:
+        if embed_task:
+            embed_task.cancel()
+        raise
+    query_embedding = await embed_task if embed_task else None
+    return db_available, conversation_id, chat_history, query_embedding
+
+
+def _save_exchange(http_request: Request, conversation_id: UUID, message: str, response: Dict[str, Any]) -> None:
+    """Queue the user message and assistant reply for background persistence"""
+    http_request.app.state.message_writer.enqueue([
+        (conversation_id, "user", message, None),
+        (conversation_id, "assistant", response["response"], {
+            "sources": response.get("sources", []),
+            "rag_metadata": response.get("metadata", {})
+        }),
+    ])
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
-    chat_service: ChatService = Depends(lambda: ChatService()),
-    db: Session = Depends(get_db)
+    http_request: Request,
+    chat_service: ChatService = Depends(get_chat_service),
+    db: Optional[AsyncSession] = Depends(get_optional_db)
 ):
     """
     Chat endpoint that uses RAG and OpenRouter with tool execution for generating responses.
     Saves messages to database if conversation_id is provided.
     """
     try:
-        # Check if database is available
-        db_available = is_db_available()
-        conversation_id = request.conversation_id
-        chat_history = request.chat_history  # Default to provided history
-        
-        # Only use database if available
-        if db_available:
-            try:
-                history_service = ChatHistoryService(db)
-                
-                # Get or create conversation
-                if not conversation_id:
-                    # Create new conversation with title from first message
-                    title = history_service.generate_conversation_title(request.message)
-                    conversation = history_service.create_conversation(title=title)
-                    conversation_id = conversation.id
-                
-                # Get existing messages from database if conversation exists
-                if conversation_id:
-                    try:
-                        existing_messages = history_service.get_messages(conversation_id)
-                        # Convert to chat_history format for LLM context
-                        if existing_messages:
-                            chat_history = []
-                            i = 0
-                            while i < len(existing_messages):
-                                if existing_messages[i].role.value == "user":
-                                    user_msg = existing_messages[i].content
-                                    assistant_msg = None
-                                    # Look for corresponding assistant message
-                                    if i + 1 < len(existing_messages) and existing_messages[i + 1].role.value == "assistant":
-                                        assistant_msg = existing_messages[i + 1].content
-                                        i += 2
-                                    else:
-                                        i += 1
-                                    chat_history.append({
-                                        "user": user_msg,
-                                        "assistant": assistant_msg
-                                    })
-                                else:
-                                    i += 1
-                    except Exception as e:
-                        print(f"⚠️ WARNING: Could not load conversation history: {e}")
-                        # Continue with provided chat_history
-            except (OperationalError, SQLAlchemyError) as e:
-                print(f"⚠️ WARNING: Database error, continuing without chat history: {e}")
-                # Continue without database
-                db_available = False
+        db_available, conversation_id, chat_history, query_embedding = await _load_chat_context_and_embedding(
+            request, db, chat_service
+        )
         
         # Get response from chat service
         response = await chat_service.get_response(
             query=request.message,
-            chat_history=chat_history
+            chat_history=chat_history,
+            query_embedding=query_embedding
         )
         
-        # Save messages to database if available
+        # Queue messages for background persistence so the response isn't blocked on DB writes
         if db_available and conversation_id:
-            try:
-                history_service = ChatHistoryService(db)
-                # Save user message
-                history_service.add_message(
-                    conversation_id=conversation_id,
-                    role="user",
-                    content=request.message
-                )
-                
-                # Save assistant message with sources in metadata
-                history_service.add_message(
-                    conversation_id=conversation_id,
-                    role="assistant",
-                    content=response["response"],
-                    metadata={
-                        "sources": response.get("sources", []),
-                        "rag_metadata": response.get("metadata", {})
-                    }
-                )
-            except Exception as e:
-                print(f"⚠️ WARNING: Could not save messages to database: {e}")
-                # Continue even if saving fails
+            _save_exchange(http_request, conversation_id, request.message, response)
         
         # Add conversation_id to response (use a placeholder UUID if DB not available)
         if not conversation_id:
-            import uuid
             conversation_id = uuid.uuid4()  # Generate a temporary ID
         response["conversation_id"] = conversation_id
         
-        return ChatResponse(**response)
+        # The response dict is built by our own code, so skip re-validating it
+        return ORJSONResponse(ChatResponse.model_construct(**response).model_dump())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    chat_service: ChatService = Depends(get_chat_service),
+    db: Optional[AsyncSession] = Depends(get_optional_db)
+):
+    """
+    Streaming variant of /chat using Server-Sent Events.
+    
+    Emits ``{"delta": "..."}`` events as tokens arrive, then a final event with
+    ``"done": true`` carrying the same fields as the /chat response.
+    """
+    try:
+        db_available, conversation_id, chat_history, query_embedding = await _load_chat_context_and_embedding(
+            request, db, chat_service
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not conversation_id:
+        conversation_id = uuid.uuid4()  # Temporary ID when the DB is unavailable
+    
+    async def event_stream():
+        async for event in chat_service.stream_response(
+            query=request.message, chat_history=chat_history, query_embedding=query_embedding
+        ):
+            if event.get("done"):
+                if db_available:
+                    _save_exchange(http_request, conversation_id, request.message, event)
+                event["conversation_id"] = conversation_id
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 class ToolRequest(BaseModel):
     tool: str
     arguments: Dict[str, Any]
@@ -124,7 +199,7 @@ class ToolResponse(BaseModel):
     tool: str
 
 @router.post("/tool", response_model=ToolResponse)
-async def execute_tool(request: ToolRequest, chat_service: ChatService = Depends(lambda: ChatService())):
+async def execute_tool(request: ToolRequest, chat_service: ChatService = Depends(get_chat_service)):
     """
     Execute a tool.
     """
@@ -145,7 +220,7 @@ async def execute_tool(request: ToolRequest, chat_service: ChatService = Depends
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/tools")
-def get_available_tools(chat_service: ChatService = Depends(lambda: ChatService())):
+def get_available_tools(chat_service: ChatService = Depends(get_chat_service)):
     """
     Get list of available tools.
     """
@@ -155,6 +230,98 @@ def get_available_tools(chat_service: ChatService = Depends(lambda: ChatService(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _resolve_kb_dir():
+    """Locate the knowledge_base directory. Returns (kb_dir or None, searched paths)."""
+    searched_paths = []
+    
+    # Method 1: Calculate from __file__ location
+    # __file__ is at: app/api/endpoints/chat.py
+    # We need to go up 4 levels to get to project root: endpoints -> api -> app -> project_root
+    try:
+        current_file = os.path.abspath(__file__)
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_file))))
+        kb_dir_candidate = os.path.join(project_root, 'knowledge_base')
+        searched_paths.append(kb_dir_candidate)
+        if os.path.isdir(kb_dir_candidate):
+            return kb_dir_candidate, searched_paths
+    except Exception as e:
+        logger.warning("Could not determine KB path from __file__: %s", e)
+    
+    # Method 2: Try relative to current working directory
+    try:
+        cwd = os.getcwd()
+        # Check if knowledge_base exists in current directory
+        kb_dir_candidate = os.path.join(cwd, 'knowledge_base')
+        searched_paths.append(kb_dir_candidate)
+        if os.path.isdir(kb_dir_candidate):
+            return kb_dir_candidate, searched_paths
+        # Check if we're in app/ directory
+        if os.path.basename(cwd) == 'app':
+            kb_dir_candidate = os.path.join(os.path.dirname(cwd), 'knowledge_base')
+            searched_paths.append(kb_dir_candidate)
+            if os.path.isdir(kb_dir_candidate):
+                return kb_dir_candidate, searched_paths
+    except Exception as e:
+        logger.warning("Could not determine KB path from CWD: %s", e)
+    
+    return None, searched_paths
+
+
+# Resolved once at import instead of on every request
+KB_DIR, _KB_SEARCHED_PATHS = _resolve_kb_dir()
+if KB_DIR:
+    KB_DIR = os.path.abspath(KB_DIR)
+
+# Safe characters only (alphanumeric, underscores, hyphens), optional .txt extension.
+# This also rules out directory traversal since '.', '/' and '\' can't appear in the name.
+_SAFE_KB_FILENAME = re.compile(r"([A-Za-z0-9_\-]+)(?:\.txt)?")
+
+
+@lru_cache(maxsize=256)
+def _read_kb_file(file_path: str, mtime_ns: int) -> str:
+    """Read a knowledge base file. The mtime is part of the cache key so edited files are re-read."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _locate_kb_file(filename: str):
+    """Validate a knowledge base filename and stat it. Returns (filename, file_path, mtime_ns)."""
+    # Security: Validate filename to prevent directory traversal
+    match = _SAFE_KB_FILENAME.fullmatch(filename)
+    if not match:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    # Ensure filename ends with .txt
+    filename = match.group(1) + '.txt'
+    
+    # If the directory wasn't found at startup, raise an error with helpful information
+    if not KB_DIR:
+        error_msg = f"Knowledge base directory not found. Searched in: {', '.join(_KB_SEARCHED_PATHS)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    
+    file_path = os.path.join(KB_DIR, filename)
+    
+    # Check if file exists (the stat result also keys the content cache)
+    try:
+        return filename, file_path, os.stat(file_path).st_mtime_ns
+    except OSError:
+        pass
+    
+    # Provide more detailed error information for debugging
+    error_detail = f"File not found: {filename}"
+    error_detail += f" | Searched in: {KB_DIR}"
+    error_detail += f" | Full path: {file_path}"
+    # List available files for debugging
+    try:
+        available_files = [f for f in os.listdir(KB_DIR) if f.endswith('.txt')]
+        error_detail += f" | Available files: {', '.join(available_files[:5])}"
+    except:
+        pass
+    logger.error(error_detail)
+    raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+
+
 @router.get("/knowledge-base/{filename}")
 async def get_knowledge_base_file(filename: str):
     """
@@ -162,92 +329,10 @@ async def get_knowledge_base_file(filename: str):
     Returns the file content as plain text.
     """
     try:
-        # Security: Validate filename to prevent directory traversal
-        # Remove .txt extension for validation
-        base_name = filename.replace('.txt', '') if filename.endswith('.txt') else filename
-        
-        # Check if base name contains only safe characters (alphanumeric, underscores, hyphens)
-        if not all(c.isalnum() or c in ('_', '-') for c in base_name):
-            raise HTTPException(status_code=400, detail="Invalid filename")
-        
-        # Ensure filename ends with .txt
-        if not filename.endswith('.txt'):
-            filename = filename + '.txt'
-        
-        # Additional security: prevent directory traversal attempts
-        if '..' in filename or '/' in filename or '\\' in filename:
-            raise HTTPException(status_code=400, detail="Invalid filename")
-        
-        # Get the knowledge base directory path
-        # Try multiple methods to find the project root and knowledge_base directory
-        kb_dir = None
-        searched_paths = []
-        
-        # Method 1: Calculate from __file__ location
-        # __file__ is at: app/api/endpoints/chat.py
-        # We need to go up 4 levels to get to project root: endpoints -> api -> app -> project_root
-        try:
-            current_file = os.path.abspath(__file__)
-            project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_file))))
-            kb_dir_candidate = os.path.join(project_root, 'knowledge_base')
-            searched_paths.append(kb_dir_candidate)
-            if os.path.exists(kb_dir_candidate):
-                kb_dir = kb_dir_candidate
-        except Exception as e:
-            print(f"WARNING: Could not determine KB path from __file__: {e}")
-        
-        # Method 2: Try relative to current working directory
-        if not kb_dir:
-            try:
-                cwd = os.getcwd()
-                # Check if knowledge_base exists in current directory
-                kb_dir_candidate = os.path.join(cwd, 'knowledge_base')
-                searched_paths.append(kb_dir_candidate)
-                if os.path.exists(kb_dir_candidate):
-                    kb_dir = kb_dir_candidate
-                # Check if we're in app/ directory
-                elif os.path.basename(cwd) == 'app':
-                    kb_dir_candidate = os.path.join(os.path.dirname(cwd), 'knowledge_base')
-                    searched_paths.append(kb_dir_candidate)
-                    if os.path.exists(kb_dir_candidate):
-                        kb_dir = kb_dir_candidate
-            except Exception as e:
-                print(f"WARNING: Could not determine KB path from CWD: {e}")
-        
-        # If still not found, raise an error with helpful information
-        if not kb_dir:
-            error_msg = f"Knowledge base directory not found. Searched in: {', '.join(searched_paths)}"
-            print(f"ERROR: {error_msg}")
-            raise HTTPException(status_code=500, detail=error_msg)
-        
-        file_path = os.path.join(kb_dir, filename)
+        filename, file_path, file_mtime_ns = _locate_kb_file(filename)
         
-        # Security: Ensure the file is within the knowledge_base directory
-        kb_dir_abs = os.path.abspath(kb_dir)
-        file_path_abs = os.path.abspath(file_path)
-        if not file_path_abs.startswith(kb_dir_abs):
-            raise HTTPException(status_code=400, detail="Invalid file path")
-        
-        # Check if file exists
-        if not os.path.exists(file_path):
-            # Provide more detailed error information for debugging
-            error_detail = f"File not found: {filename}"
-            error_detail += f" | Searched in: {kb_dir_abs}"
-            error_detail += f" | Full path: {file_path_abs}"
-            error_detail += f" | KB dir exists: {os.path.exists(kb_dir_abs)}"
-            if os.path.exists(kb_dir_abs):
-                # List available files for debugging
-                try:
-                    available_files = [f for f in os.listdir(kb_dir_abs) if f.endswith('.txt')]
-                    error_detail += f" | Available files: {', '.join(available_files[:5])}"
-                except:
-                    pass
-            print(f"ERROR: {error_detail}")  # Log to server console
-            raise HTTPException(status_code=404, detail=f"File not found: {filename}")
-        
-        # Read and return file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Read and return file content (served from memory until the file changes)
+        content = _read_kb_file(file_path, file_mtime_ns)
         
         return {
             "filename": filename,
@@ -258,3 +343,18 @@ async def get_knowledge_base_file(filename: str):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+
+
+@router.get("/knowledge-base/{filename}/raw")
+async def get_knowledge_base_file_raw(filename: str):
+    """
+    Stream a knowledge base file as text/plain.
+    Uses FileResponse so the body is sent with sendfile instead of being JSON-encoded.
+    """
+    try:
+        filename, file_path, _ = _locate_kb_file(filename)
+        return FileResponse(file_path, media_type="text/plain; charset=utf-8", filename=filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
@@ -1,70 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import hashlib
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from app.models.database import get_db, is_db_available
+from app.models.database import get_db, get_optional_db
 from app.models.schemas import (
     ConversationCreate,
     ConversationUpdate,
     ConversationResponse,
     ConversationWithMessages,
     ConversationListItem,
-    MessageResponse
+    MessageResponse,
+    MESSAGE_LIST_ADAPTER
 )
 from app.models.chat_models import Conversation, Message
 from app.services.chat_history import ChatHistoryService
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+def _conversation_response(conversation: Conversation) -> ORJSONResponse:
+    """Serialize a conversation row. ORM rows are already shape-correct, so skip validation."""
+    return ORJSONResponse(ConversationResponse.model_construct(
+        id=conversation.id,
+        title=conversation.title,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        user_id=conversation.user_id
+    ).model_dump())
+
+
 @router.get("/", response_model=List[ConversationListItem])
 async def list_conversations(
+    http_request: Request,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_optional_db)
 ):
-    """List all conversations"""
-    # Check if database is available
-    if not is_db_available():
+    """List all conversations. Supports If-None-Match so unchanged lists return 304."""
+    if db is None:
         # Return empty list if database is not available
         return []
     
     try:
         service = ChatHistoryService(db)
-        conversations = service.list_conversations(limit=limit)
+        
+        # Cheap version check first - skip the list query entirely if the client is up to date
+        latest, count = await service.get_conversations_version()
+        version = f"{latest.isoformat() if latest else ''}|{count}|{limit}"
+        etag = 'W/"' + hashlib.md5(version.encode("utf-8")).hexdigest() + '"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, max-age=5"}
+        if http_request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=cache_headers)
+        
+        # One round-trip for the conversations, their message counts and last messages
+        rows = await service.list_conversation_summaries(limit=limit, preview_length=100)
         
         # Convert to list items with preview
         result = []
-        for conv in conversations:
-            try:
-                # Get last message for preview
-                messages = service.get_messages(conv.id, limit=1)
-                if messages:
-                    last_msg = messages[0].content
-                    preview = last_msg[:100] + "..." if len(last_msg) > 100 else last_msg
-                else:
-                    preview = None
-                
-                result.append(ConversationListItem(
-                    id=conv.id,
-                    title=conv.title,
-                    updated_at=conv.updated_at,
-                    preview=preview,
-                    message_count=len(conv.messages)
-                ))
-            except Exception as e:
-                # Skip conversations that have issues
-                print(f"⚠️ Warning: Could not load conversation {conv.id}: {e}")
-                continue
+        for row in rows:
+            last_msg = row.last_message
+            if last_msg:
+                preview = last_msg[:100] + "..." if len(last_msg) > 100 else last_msg
+            else:
+                preview = None
+            
+            # Rows come straight from the database, so skip field validation
+            result.append(ConversationListItem.model_construct(
+                id=row.id,
+                title=row.title,
+                updated_at=row.updated_at,
+                preview=preview,
+                message_count=row.message_count
+            ).model_dump())
         
-        return result
+        return ORJSONResponse(result, headers=cache_headers)
     except (OperationalError, SQLAlchemyError) as e:
         # Database connection error - return empty list
-        print(f"⚠️ Database error in list_conversations: {e}")
+        logger.warning("Database error in list_conversations: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
         return []
     except Exception as e:
-        print(f"⚠️ Error in list_conversations: {e}")
+        logger.warning("Error in list_conversations: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
         # Return empty list instead of raising error
         return []
 
@@ -72,21 +94,15 @@ async def list_conversations(
 @router.post("/", response_model=ConversationResponse)
 async def create_conversation(
     conversation: ConversationCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new conversation"""
-    if not is_db_available():
-        raise HTTPException(
-            status_code=503,
-            detail="Database not available. Please set up PostgreSQL and configure DATABASE_URL in .env"
-        )
-    
     try:
         service = ChatHistoryService(db)
-        new_conversation = service.create_conversation(
+        new_conversation = await service.create_conversation(
             title=conversation.title
         )
-        return ConversationResponse.model_validate(new_conversation)
+        return _conversation_response(new_conversation)
     except (OperationalError, SQLAlchemyError) as e:
         raise HTTPException(
             status_code=503,
@@ -99,17 +115,18 @@ async def create_conversation(
 @router.get("/{conversation_id}", response_model=ConversationWithMessages)
 async def get_conversation(
     conversation_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a conversation with all its messages"""
     try:
         service = ChatHistoryService(db)
-        conversation = service.get_conversation_with_messages(conversation_id)
+        # Postgres builds the JSON body directly, so there's nothing to validate or re-encode
+        conversation_json = await service.get_conversation_json(conversation_id)
         
-        if not conversation:
+        if not conversation_json:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        return ConversationWithMessages.model_validate(conversation)
+        return Response(content=conversation_json, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -120,17 +137,17 @@ async def get_conversation(
 async def update_conversation(
     conversation_id: UUID,
     update_data: ConversationUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a conversation (e.g., change title)"""
     try:
         service = ChatHistoryService(db)
-        conversation = service.update_conversation(conversation_id, update_data)
+        conversation = await service.update_conversation(conversation_id, update_data)
         
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        return ConversationResponse.model_validate(conversation)
+        return _conversation_response(conversation)
     except HTTPException:
         raise
     except Exception as e:
@@ -140,12 +157,12 @@ async def update_conversation(
 @router.delete("/{conversation_id}")
 async def delete_conversation(
     conversation_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a conversation and all its messages"""
     try:
         service = ChatHistoryService(db)
-        success = service.delete_conversation(conversation_id)
+        success = await service.delete_conversation(conversation_id)
         
         if not success:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -161,19 +178,21 @@ async def delete_conversation(
 async def get_messages(
     conversation_id: UUID,
     limit: int = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get messages for a conversation"""
     try:
         service = ChatHistoryService(db)
         
         # Verify conversation exists
-        conversation = service.get_conversation(conversation_id)
+        conversation = await service.get_conversation(conversation_id)
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        messages = service.get_messages(conversation_id, limit=limit)
-        return [MessageResponse.model_validate(msg) for msg in messages]
+        messages = await service.get_messages(conversation_id, limit=limit)
+        # Validate straight from the ORM rows and serialize to JSON in pydantic-core
+        validated = MESSAGE_LIST_ADAPTER.validate_python(messages, from_attributes=True)
+        return Response(content=MESSAGE_LIST_ADAPTER.dump_json(validated), media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -21,44 +21,53 @@ class Settings(BaseSettings):
     SECRET_KEY: Optional[str] = None
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    MAX_REQUEST_BODY_BYTES: int = 65536
     
     # RAG Settings
     COLLECTION_NAME: str = "documents"
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BACKEND: str = "torch"  # or "onnx" (needs sentence-transformers[onnx])
+    EMBEDDING_ONNX_FILE: Optional[str] = None  # e.g. "onnx/model_qint8_avx512_vnni.onnx" for int8 weights
+    EMBEDDING_THREADS: Optional[int] = None  # torch intra-op threads; defaults to the CPU count
+    EMBEDDING_CACHE_SIZE: int = 4096  # recent query embeddings kept per VectorStore
     CHUNK_SIZE: int = 500
     CHUNK_OVERLAP: int = 50
     
+    # Semantic response cache (shared via Redis Stack if REDIS_URL is set, otherwise in-process)
+    REDIS_URL: Optional[str] = None
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9
+    SEMANTIC_CACHE_TTL: int = 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000  # in-process cache only
+    SEMANTIC_CACHE_PATH: Optional[str] = None  # in-process cache only; saved on shutdown, loaded on startup
+    
     # Tooling
     USE_MCP: bool = False
     
     # Database
     DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_TIMEOUT: int = 5  # seconds to wait for a free connection
+    DB_STATEMENT_TIMEOUT_MS: int = 10000
     
     class Config:
         env_file = ".env"
-        
+        frozen = True  # Parsed once; immutable (and hashable) afterwards
+
 
+def is_placeholder_api_key(api_key: Optional[str]) -> bool:
+    """Whether the OpenRouter API key is missing or still the .env.example placeholder."""
+    return not api_key or api_key == "your-openrouter-api-key-here"
 
-_settings_instance = None
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Get settings instance. Cache is cleared on import to ensure fresh settings."""
-    global _settings_instance
-    if _settings_instance is None:
-        _settings_instance = Settings()
-        # Warn if OPENROUTER_API_KEY is not set
-        if not _settings_instance.OPENROUTER_API_KEY or _settings_instance.OPENROUTER_API_KEY == "your-openrouter-api-key-here":
-            try:
-                print("WARNING: OPENROUTER_API_KEY is not set or is using placeholder value.")
-                print("Please set OPENROUTER_API_KEY in your .env file to use the chat functionality.")
-                print("Get your API key from: https://openrouter.ai")
-            except UnicodeEncodeError:
-                # Fallback for Windows console encoding issues
-                print("WARNING: OPENROUTER_API_KEY is not set or is using placeholder value.")
-                print("Please set OPENROUTER_API_KEY in your .env file to use the chat functionality.")
-    return _settings_instance
+    """Get the settings instance. The environment is parsed once and cached."""
+    return Settings()
+
 
 def clear_settings_cache():
     """Clear the settings cache. Useful for testing or when .env changes."""
-    global _settings_instance
-    _settings_instance = None
+    get_settings.cache_clear()
@@ -0,0 +1,75 @@
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class _BodyTooLarge(HTTPException):
+    """Raised from the wrapped receive() once a body without Content-Length passes the limit.
+
+    An HTTPException so FastAPI's body parsing re-raises it as a 413 instead of
+    reporting a generic parse error.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(status_code=413, detail="Request body too large")
+
+
+class RequestSizeLimitMiddleware:
+    """Pure ASGI middleware that rejects oversized requests before any body parsing.
+
+    Requests with a Content-Length header are checked up front, so it costs O(1) per
+    request instead of letting FastAPI/Pydantic read and validate a large body first.
+    Bodies without one (``Transfer-Encoding: chunked``) are counted as they are read
+    and cut off as soon as they pass the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int = 65536) -> None:
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    response = PlainTextResponse("Invalid Content-Length header", status_code=400)
+                    await response(scope, receive, send)
+                    return
+                if content_length > self.max_body_size:
+                    response = PlainTextResponse("Request body too large", status_code=413)
+                    await response(scope, receive, send)
+                    return
+                # The server enforces the declared length, so the body needn't be counted
+                await self.app(scope, receive, send)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracked_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except _BodyTooLarge:
+            if response_started:
+                raise
+            response = PlainTextResponse("Request body too large", status_code=413)
+            await response(scope, receive, send)
@@ -1,18 +1,50 @@
+import asyncio
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api.endpoints import chat, conversations
-from app.core.config import get_settings
-from app.models.database import init_db, engine, Base
+from app.core.config import get_settings, is_placeholder_api_key
+from app.core.middleware import RequestSizeLimitMiddleware
+from app.models.database import init_db, engine, Base, monitor_db_connection
 from app.models import chat_models
+from app.services.message_writer import MessageWriter
+from app.services.chat import ChatService
 
 settings = get_settings()
 
+
+def setup_logging() -> QueueListener:
+    """Route log records through a queue so handler I/O happens off the event loop"""
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root_logger = logging.getLogger()
+    root_logger.handlers = [QueueHandler(log_queue)]
+    root_logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+log_listener = setup_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="Advanced RAG Chatbot",
     description="A sophisticated chatbot using RAG, OpenRouter, and graph-based retrieval",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Reject oversized bodies before any parsing. Added before CORS so it runs inside it:
+# the 413/400 responses then carry CORS headers and the browser can read them.
+app.add_middleware(RequestSizeLimitMiddleware, max_body_size=settings.MAX_REQUEST_BODY_BYTES)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,19 +58,67 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables on application startup"""
-    from app.models.database import engine, is_db_available
+    from app.models.database import engine, check_db_connection
     
-    if is_db_available() and engine:
+    # Warn once at startup if OPENROUTER_API_KEY is not set
+    if is_placeholder_api_key(settings.OPENROUTER_API_KEY):
+        logger.warning("OPENROUTER_API_KEY is not set or is using placeholder value.")
+        logger.warning("Please set OPENROUTER_API_KEY in your .env file to use the chat functionality.")
+        logger.warning("Get your API key from: https://openrouter.ai")
+    
+    if engine and await check_db_connection():
         try:
             # Create tables - use Base from database module which is shared
-            Base.metadata.create_all(bind=engine)
-            print("Database tables initialized successfully")
+            await init_db()
+            logger.info("Database tables initialized successfully")
         except Exception as e:
-            print(f"WARNING: Could not initialize database tables: {e}")
-            print("The application will continue but chat history will not be saved")
+            logger.warning("Could not initialize database tables: %s", e)
+            logger.warning("The application will continue but chat history will not be saved")
     else:
-        print("Database not available - chat history features disabled")
-        print("To enable chat history, set up PostgreSQL and configure DATABASE_URL in .env")
+        logger.info("Database not available - chat history features disabled")
+        logger.info("To enable chat history, set up PostgreSQL and configure DATABASE_URL in .env")
+    
+    # Keep the cached availability flag fresh without probing on every request
+    if engine:
+        app.state.db_monitor = asyncio.create_task(monitor_db_connection(interval=5.0))
+    
+    # Build the chat service once and share it across requests
+    try:
+        app.state.chat_service = ChatService()
+        app.state.chat_service_error = None
+    except Exception as e:
+        logger.warning("Could not initialize chat service: %s", e)
+        app.state.chat_service = None
+        app.state.chat_service_error = str(e)
+    
+    # Load the embedding model in a worker thread while startup finishes, instead of
+    # on the first request; the reference keeps the task from being garbage collected
+    if app.state.chat_service:
+        app.state.encoder_warmup = asyncio.create_task(
+            asyncio.to_thread(app.state.chat_service.vector_store.warmup)
+        )
+    
+    # Persist chat messages in the background so responses don't wait on DB writes
+    app.state.message_writer = MessageWriter(maxsize=500)
+    app.state.message_writer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued message writes and stop background tasks before the application exits"""
+    writer = getattr(app.state, "message_writer", None)
+    if writer:
+        await writer.stop()
+    
+    db_monitor = getattr(app.state, "db_monitor", None)
+    if db_monitor:
+        db_monitor.cancel()
+    
+    chat_service = getattr(app.state, "chat_service", None)
+    if chat_service:
+        await chat_service.close()
+    
+    log_listener.stop()
 
 # Include routers
 app.include_router(chat.router, prefix="/api", tags=["chat"])
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Enum as SQLEnum, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 from app.models.database import Base
 from datetime import datetime
@@ -39,11 +39,25 @@ class Message(Base):
     
     # Metadata for storing sources and other info
     # Using 'message_data' to avoid SQLAlchemy 'metadata' reserved name conflict
-    message_data = Column('message_data', JSON, nullable=True)
+    message_data = Column('message_data', JSONB, nullable=True)
 
     # Relationship
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        # Postgres doesn't index foreign keys; this covers lookups by conversation
+        # and serves the ORDER BY created_at straight from the index
+        Index("ix_messages_conversation_id_created_at", conversation_id, created_at),
+        # jsonb_path_ops supports @> containment (Message.message_data.contains(...))
+        # with a much smaller index than the default jsonb_ops
+        Index(
+            "ix_messages_data_gin",
+            message_data,
+            postgresql_using="gin",
+            postgresql_ops={"message_data": "jsonb_path_ops"},
+        ),
+    )
+
     def __repr__(self):
         return f"<Message(id={self.id}, role={self.role}, conversation_id={self.conversation_id})>"
 
@@ -1,83 +1,164 @@
-from sqlalchemy import create_engine
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.exc import OperationalError
 from app.core.config import get_settings
 
 settings = get_settings()
 
-# Initialize engine as None, will be set if connection succeeds
+logger = logging.getLogger(__name__)
+
+
+def _to_async_url(db_url: str) -> str:
+    """Rewrite a plain postgresql:// URL to use the asyncpg driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if db_url.startswith(prefix):
+            return "postgresql+asyncpg://" + db_url[len(prefix):]
+    return db_url
+
+
+# Initialize engine as None, will be set if DATABASE_URL is configured
 engine = None
-SessionLocal = None
+AsyncSessionLocal = None
 _db_available = False
 
 try:
-    # Only try to connect if DATABASE_URL is provided and not empty
+    # Only create an engine if DATABASE_URL is provided and not empty
     db_url = settings.DATABASE_URL
     if db_url and db_url.strip():
-        # Create database engine
-        engine = create_engine(
-            db_url,
+        # Create async database engine (connection is verified at startup)
+        engine = create_async_engine(
+            _to_async_url(db_url.strip()),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            # Fail fast when the pool is exhausted instead of queueing requests for 30s
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            # Check each connection on checkout so a Postgres restart or failover
+            # doesn't hand requests dead pooled connections
             pool_pre_ping=True,
             echo=settings.DEBUG,
-            connect_args={"connect_timeout": 3}
+            connect_args={
+                "timeout": 3,
+                # Cap runaway queries server-side so they can't pin pooled connections
+                "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)},
+            }
         )
-        # Test connection with a shorter timeout
-        from sqlalchemy import text
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        _db_available = True
-        print("Database connection successful")
-        
+
         # Create session factory
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
     else:
-        print("DATABASE_URL not configured - chat history features disabled")
-        _db_available = False
+        logger.info("DATABASE_URL not configured - chat history features disabled")
 except Exception as e:
-    print(f"WARNING: Could not connect to database: {str(e)}")
-    print("Chat history features will be disabled. The app will continue to work without database.")
-    print("To enable chat history, please set up PostgreSQL and update DATABASE_URL in .env")
-    _db_available = False
+    logger.warning("Could not create database engine: %s", e)
+    logger.warning("Chat history features will be disabled. The app will continue to work without database.")
     engine = None
-    SessionLocal = None
+    AsyncSessionLocal = None
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session"""
-    if not _db_available or SessionLocal is None:
-        # Return a mock session that raises an error when used
-        class MockSession:
-            def query(self, *args):
-                raise OperationalError("Database not available", None, None)
-            def __enter__(self):
-                return self
-            def __exit__(self, *args):
-                pass
-        yield MockSession()
-        return
-    
-    db = SessionLocal()
+async def check_db_connection() -> bool:
+    """Test the database connection and record whether it is available"""
+    global _db_available
+    if engine is None:
+        _db_available = False
+        return False
+
+    was_available = _db_available
     try:
-        yield db
-    except OperationalError as e:
-        print(f"Database connection error: {e}")
-        db.rollback()
-        raise
-    finally:
-        db.close()
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        _db_available = True
+        if not was_available:
+            logger.info("Database connection successful")
+    except Exception as e:
+        _db_available = False
+        if was_available:
+            logger.warning("Lost connection to database: %s", e)
+        else:
+            logger.warning("Could not connect to database: %s", e)
+            logger.warning("Chat history features will be disabled. The app will continue to work without database.")
+            logger.warning("To enable chat history, please set up PostgreSQL and update DATABASE_URL in .env")
+    return _db_available
+
+
+async def monitor_db_connection(interval: float = 5.0):
+    """Periodically re-check the database so is_db_available() never probes on the request path"""
+    while True:
+        await asyncio.sleep(interval)
+        was_available = _db_available
+        if await check_db_connection() and not was_available:
+            # Database came up after startup - make sure the tables exist
+            try:
+                await init_db()
+            except Exception as e:
+                logger.warning("Could not initialize database tables: %s", e)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency for getting database session. Responds 503 straight away if the database is down."""
+    if not _db_available or AsyncSessionLocal is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Database not available. Please set up PostgreSQL and configure DATABASE_URL in .env"
+        )
+
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except OperationalError as e:
+            logger.warning("Database connection error: %s", e)
+            await db.rollback()
+            raise
+
+
+async def get_optional_db() -> AsyncIterator[Optional[AsyncSession]]:
+    """Dependency for routes that work without chat history: yields None if the database is down."""
+    if not _db_available or AsyncSessionLocal is None:
+        yield None
+        return
+
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except OperationalError as e:
+            logger.warning("Database connection error: %s", e)
+            await db.rollback()
+            raise
 
 
 def is_db_available():
-    """Check if database is available"""
+    """Check if database is available (cached result of the last background check)"""
     return _db_available
 
 
-def init_db():
+# create_all() doesn't alter existing tables, so bring older schemas up to date here.
+# Every statement is idempotent.
+_SCHEMA_UPGRADES = [
+    # messages.message_data used to be a plain json column
+    """
+    DO $$ BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'messages' AND column_name = 'message_data') = 'json' THEN
+            ALTER TABLE messages ALTER COLUMN message_data TYPE jsonb USING message_data::jsonb;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_created_at ON messages (conversation_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_data_gin ON messages USING gin (message_data jsonb_path_ops)",
+]
+
+
+async def init_db():
     """Initialize database tables"""
     if engine and _db_available:
-        Base.metadata.create_all(bind=engine)
-
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for statement in _SCHEMA_UPGRADES:
+                await conn.execute(text(statement))
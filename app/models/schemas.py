@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, TypeAdapter, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from uuid import UUID
@@ -16,28 +16,32 @@ class MessageCreate(MessageBase):
 
 
 class MessageResponse(MessageBase):
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
     id: UUID
     conversation_id: UUID
     created_at: datetime
+    # ORM rows store this as message_data. It is listed first because the declarative
+    # models also expose an unrelated ``metadata`` attribute (the table MetaData).
+    metadata: Optional[Dict[str, Any]] = Field(
+        default=None,
+        validation_alias=AliasChoices("message_data", "metadata")
+    )
+
+    @field_validator("role", mode="before")
+    @classmethod
+    def _role_value(cls, v):
+        """Accept MessageRole members as well as plain strings"""
+        return v.value if hasattr(v, "value") else v
 
+    @field_validator("metadata", mode="before")
     @classmethod
-    def model_validate(cls, obj):
-        """Override to map message_data to metadata"""
-        if hasattr(obj, 'message_data'):
-            # Create a dict with metadata mapped from message_data
-            data = {
-                'id': obj.id,
-                'conversation_id': obj.conversation_id,
-                'role': obj.role.value if hasattr(obj.role, 'value') else obj.role,
-                'content': obj.content,
-                'created_at': obj.created_at,
-                'metadata': obj.message_data or {}
-            }
-            return cls(**data)
-        return super().model_validate(obj)
+    def _metadata_default(cls, v):
+        return v if v is not None else {}
 
-    class Config:
-        from_attributes = True
+
+# Built once and reused so list responses don't rebuild the validator/serializer per call
+MESSAGE_LIST_ADAPTER = TypeAdapter(List[MessageResponse])
 
 
 # Conversation Schemas
@@ -64,6 +68,9 @@ class ConversationResponse(ConversationBase):
 
 
 class ConversationWithMessages(ConversationResponse):
+    # Documents the response shape. The endpoint returns JSON built by Postgres, so
+    # this is never validated on the request path; build it with model_construct()
+    # if it ever needs to be filled from ORM rows.
     messages: List[MessageResponse] = []
 
 
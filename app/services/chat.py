@@ -1,13 +1,142 @@
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import httpx
 import openai
 import asyncio
-from app.core.config import get_settings
+import hashlib
+import logging
+import re
+import time
+from string import Template
+from collections import OrderedDict
+from functools import lru_cache
+from app.core.config import get_settings, is_placeholder_api_key
 from app.services.vector_store import VectorStore
 from app.services.rag.graph_rag import GraphRAG
 from app.services.tool_gateway import ToolGateway
+from app.services.tool_service import is_successful_result
+from app.services.semantic_cache import InProcessSemanticCache, SemanticCache, get_semantic_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional - context is then capped by characters
+    tiktoken = None
 
 settings = get_settings()
 
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = "openai/gpt-3.5-turbo"
+
+# Queries with a word starting with any of these (case-insensitive) also get a web search.
+# Anchoring at a word start keeps inflections ("trends", "updated") but stops matches
+# inside unrelated words ("know" -> "now", "renew" -> "new").
+_WEB_TRIGGER_KEYWORDS = [
+    'current', 'latest', 'today', 'recent', 'now', '2024', '2025', 'breaking', 'news',
+    'more', 'additional', 'expand', 'elaborate', 'details', 'comprehensive', 'complete',
+    'update', 'new', 'advance', 'development', 'trend', 'state of', 'overview'
+]
+_WEB_TRIGGER_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, _WEB_TRIGGER_KEYWORDS)) + ")", re.IGNORECASE)
+
+# Knowledge base excerpt budget for the prompt, in model tokens
+MAX_CONTEXT_TOKENS = 500
+# Cap on the whole system prompt; web results are cut to whatever the rest leaves
+MAX_SYSTEM_PROMPT_TOKENS = 1500
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Tokenizer for the LLM, loaded on first use. None if tiktoken isn't available."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(LLM_MODEL.split("/")[-1])
+    except Exception as e:
+        logger.warning("Could not load tiktoken encoding, truncating context by characters: %s", e)
+        return None
+
+
+@lru_cache(maxsize=256)
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens, on a token boundary.
+    
+    Cached: the same few knowledge base documents are the top hit for most queries,
+    and hashing the text is far cheaper than re-tokenizing it.
+    """
+    # Every token covers at least one byte, so an ASCII text (one byte per character)
+    # no longer than the budget can't exceed it. Not true for other text: a CJK
+    # character or an emoji can take two or three tokens.
+    n = len(text)
+    if n <= max_tokens and text.isascii():
+        return text
+    encoding = _get_encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        max_chars = max_tokens * 4
+        return text[:max_chars] + "..." if n > max_chars else text
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + "..."
+
+
+def _count_tokens(text: str) -> int:
+    """Number of model tokens in text (estimated at four characters per token without tiktoken)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text))
+
+
+# System prompts. The instructions are static and come first so every request shares the
+# same prompt prefix (lets providers with prefix caching reuse it); only the source
+# section at the end is filled in per request.
+_INSTRUCTIONS_KB_AND_WEB = """You are a helpful AI assistant with access to a knowledge base and current web information.
+
+INSTRUCTIONS:
+1. Provide a CONCISE, natural answer based on the knowledge base content below
+2. DO NOT repeat or copy the entire document - only use relevant information that answers the user's question
+3. Use web information only to supplement or provide additional context if needed
+4. ALWAYS cite the primary source by the name given below (e.g., "According to <source>, ...")
+5. Keep your response focused and answer only what was asked
+6. If the primary source doesn't fully answer the question, acknowledge this and use web information to fill gaps
+7. The user can click on the source to view the full document if they need more details
+"""
+
+_SOURCES_KB_AND_WEB = Template("""
+PRIMARY SOURCE (Highest Matching Document from Knowledge Base):
+Source: $source_name
+Relevance Score: $relevance_score
+
+RELEVANT CONTENT FROM PRIMARY SOURCE (excerpt):
+$context
+
+CURRENT WEB INFORMATION (Supplementary):
+$web""")
+
+_INSTRUCTIONS_KB_ONLY = """You are a helpful AI assistant with access to a knowledge base.
+
+INSTRUCTIONS:
+1. Provide a CONCISE, natural answer based on the content provided below
+2. DO NOT repeat or copy the entire document - only extract and present relevant information that answers the user's question
+3. ALWAYS cite the source by the name given below, at the beginning or end of your response
+4. Format your response naturally: "According to <source>, [your concise answer]" or "[your concise answer] (Source: <source>)"
+5. Keep your response focused - answer only what was asked, not everything in the document
+6. If the source doesn't contain enough information to fully answer the question, acknowledge this limitation
+7. Do not make up information not in the provided source
+8. The user can click on the source citation to view the full document if they need more details
+9. Your answer should be brief and to the point - the full document is available if the user wants to read it
+"""
+
+_SOURCES_KB_ONLY = Template("""
+PRIMARY SOURCE (Highest Matching Document):
+Source: $source_name
+Relevance Score: $relevance_score
+
+RELEVANT CONTENT FROM SOURCE (excerpt):
+$context""")
+
+_PROMPT_NO_CONTEXT = """You are a helpful AI assistant. The knowledge base search didn't return relevant results for this query. Please provide a general answer based on your training data and mention that you don't have specific information in your knowledge base for this topic."""
+
 class ChatService:
     def __init__(self):
         self.vector_store = VectorStore()
@@ -22,92 +151,317 @@ class ChatService:
                 "OPENROUTER_API_KEY is not configured. "
                 "Please set it in the .env file and restart the server."
             )
+        # Still the .env.example placeholder: start anyway so the UI can explain the problem
+        self.api_key_configured = not is_placeholder_api_key(current_settings.OPENROUTER_API_KEY)
         
-        self.openai_client = openai.OpenAI(
+        # One pooled HTTP client for all OpenRouter calls, so connections (and their
+        # TLS sessions) are kept alive and reused across requests
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=30.0
+        )
+        
+        # Async client so the LLM round-trip doesn't block the event loop
+        self.openai_client = openai.AsyncOpenAI(
             api_key=current_settings.OPENROUTER_API_KEY,
-            base_url="https://openrouter.ai/api/v1"
+            base_url="https://openrouter.ai/api/v1",
+            max_retries=0,
+            timeout=30.0,
+            http_client=self._http_client
         )
         
         self.tool_gateway = ToolGateway()
-        print("Tool service initialized successfully")
-        print("OpenRouter client initialized successfully")
+        self.semantic_cache = get_semantic_cache(model=LLM_MODEL, top_k=5)
         
-    async def get_response(self, query: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
-        """Generate a response using RAG and OpenRouter with tool execution."""
+        # Recent web search results keyed by normalized query: key -> (expires_at, result)
+        self._web_search_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._web_search_cache_size = 1024
+        self._web_search_cache_ttl = 300.0  # seconds
+        # Rephrasings of a recent query ("weather in NYC" / "what's the weather in New York")
+        # reuse its results when their embeddings are close enough. Same TTL as the exact
+        # cache, so an exact repeat can't get older results through this one.
+        self._web_search_semantic_cache = InProcessSemanticCache(
+            threshold=0.92, ttl=int(self._web_search_cache_ttl), max_entries=512
+        )
+        logger.info("Tool service initialized successfully")
+        logger.info("OpenRouter client initialized successfully")
+        
+    async def close(self):
+        """Release the HTTP clients and persist the in-process semantic cache if configured."""
+        if settings.SEMANTIC_CACHE_PATH and hasattr(self.semantic_cache, "save"):
+            try:
+                await asyncio.to_thread(self.semantic_cache.save, settings.SEMANTIC_CACHE_PATH)
+            except Exception as e:
+                logger.warning("Could not save semantic cache: %s", e)
+        await self.tool_gateway.close()
+        await self.openai_client.close()
+        await self._http_client.aclose()
+    
+    @property
+    def needs_query_embedding(self) -> bool:
+        """Whether anything would use the query embedding: retrieval or the semantic cache."""
+        return self.vector_store.client is not None or self.semantic_cache is not None
+    
+    async def embed_query(self, query: str):
+        """Encode the query off the event loop, or return None if the encoder fails.
+        
+        Pass the result to get_response() or stream_response(). Without an embedding
+        the semantic cache and knowledge base retrieval are skipped, and the query is
+        still answered by the LLM.
+        """
+        try:
+            return await asyncio.to_thread(self.vector_store.embed, query)
+        except Exception as e:
+            logger.warning("Could not encode query, continuing without retrieval or the semantic cache: %s", e)
+            return None
+    
+    async def _cache_lookup(self, query_embedding, chat_history: List[Dict[str, str]] = None):
+        """Look the query up in the semantic cache. Returns (history_key, cached_response).
+        
+        A failing cache counts as a miss, so the query is still answered.
+        """
+        history_key = SemanticCache.history_key(chat_history)
+        try:
+            cached = await self.semantic_cache.lookup(query_embedding, history_key)
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+            cached = None
+        if cached is not None:
+            logger.debug("Semantic cache hit, skipping retrieval and LLM call")
+            cached.setdefault("metadata", {})["semantic_cache_hit"] = True
+        return history_key, cached
+    
+    @staticmethod
+    def _should_cache(response: Dict[str, Any]) -> bool:
+        """Errors aren't cached, and neither are answers built on web results (they go stale)."""
+        metadata = response.get("metadata", {})
+        return not metadata.get("error") and not metadata.get("web_search_used")
+    
+    async def get_response(
+        self,
+        query: str,
+        chat_history: List[Dict[str, str]] = None,
+        query_embedding=None
+    ) -> Dict[str, Any]:
+        """Generate a response, serving semantically similar repeat queries from the cache.
+        
+        ``query_embedding`` comes from embed_query(); when it is None the semantic
+        cache and knowledge base retrieval are skipped.
+        """
+        if self.semantic_cache is None or query_embedding is None:
+            return await self._generate_response(query, chat_history, query_embedding)
+        
+        history_key, cached = await self._cache_lookup(query_embedding, chat_history)
+        if cached is not None:
+            return cached
+        
+        response = await self._generate_response(query, chat_history, query_embedding)
+        if self._should_cache(response):
+            await self.semantic_cache.store(query_embedding, response, history_key)
+        return response
+    
+    async def stream_response(
+        self,
+        query: str,
+        chat_history: List[Dict[str, str]] = None,
+        query_embedding=None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a response as ``{"delta": text}`` events as tokens arrive from OpenRouter.
+        
+        The last event is ``{"done": True, ...}`` carrying the same fields as get_response()
+        (full response text, context, sources and metadata). ``query_embedding`` is
+        handled as in get_response().
+        """
+        history_key = None
+        use_cache = self.semantic_cache is not None and query_embedding is not None
+        if use_cache:
+            history_key, cached = await self._cache_lookup(query_embedding, chat_history)
+            if cached is not None:
+                yield {"done": True, **cached}
+                return
+        
+        messages, enhanced_context, top_source_info, web_search_result = await self._prepare_messages(
+            query, chat_history, query_embedding
+        )
+        
+        # Check if API key is configured before making the request
+        if not self.api_key_configured:
+            yield {"done": True, **self._api_key_error_response(enhanced_context)}
+            return
+        
+        chunks = []
+        model = LLM_MODEL
+        try:
+            logger.debug("Streaming response from OpenRouter...")
+            stream = await self.openai_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500,
+                stream=True
+            )
+            async for chunk in stream:
+                model = chunk.model or model
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield {"delta": delta}
+        except Exception as e:
+            yield {"done": True, **self._api_error_response(e, enhanced_context)}
+            return
+        
+        # Usage isn't reported on streamed completions
+        result = self._build_result(
+            query, "".join(chunks), enhanced_context, top_source_info, web_search_result,
+            model=model, total_tokens=None
+        )
+        if use_cache and self._should_cache(result):
+            await self.semantic_cache.store(query_embedding, result, history_key)
+        yield {"done": True, **result}
+    
+    def _retrieve(self, query_embedding) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Run the (blocking) knowledge base search for an encoded query. Returns (enhanced_context, top_source_info)."""
         # Store the top matching document for citation
         top_document = None
         top_source_info = None
         
         try:
             # Get relevant documents from knowledge base (get multiple for analysis, but use only top one)
-            relevant_docs = self.vector_store.semantic_search(query, limit=5)
-            print(f"DEBUG: Vector search found {len(relevant_docs)} documents from knowledge base")
+            relevant_docs = self.vector_store.semantic_search_by_vector(query_embedding, limit=5)
+            logger.debug("Vector search found %d documents from knowledge base", len(relevant_docs))
             
             # Show what documents were found
-            for i, doc in enumerate(relevant_docs):
-                try:
-                    topic = doc.get('metadata', {}).get('topic', 'Unknown')
-                    category = doc.get('metadata', {}).get('category', 'Unknown')
-                    score = doc.get('score', 0.0)
-                    print(f"   Document {i+1}. {topic} ({category}) - Score: {score:.3f}")
-                except Exception as e:
-                    print(f"   Could not parse document {i+1}: {e}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, doc in enumerate(relevant_docs):
+                    doc_metadata = doc.get('metadata', {})
+                    logger.debug("   Document %d. %s (%s) - Score: %.3f", i + 1, doc_metadata.get('topic', 'Unknown'), doc_metadata.get('category', 'Unknown'), doc.get('score', 0.0))
             
-            # Select only the highest scoring document (top match)
+            # Use only the highest scoring document (top match). Qdrant returns hits
+            # ordered by score, best first, so no scan or sort is needed.
             if relevant_docs:
-                # Sort by score (highest first) and take the top one
-                sorted_docs = sorted(relevant_docs, key=lambda x: x.get('score', 0.0), reverse=True)
-                top_document = sorted_docs[0]
-                
-                print(f"DEBUG: Using top match - Score: {top_document.get('score', 0.0):.3f}")
-                print(f"DEBUG: Top document topic: {top_document.get('metadata', {}).get('topic', 'Unknown')}")
+                top_document = relevant_docs[0]
+                top_score = top_document.get('score', 0.0)
+                logger.debug("Using top match - Score: %.3f", top_score)
+                logger.debug("Top document topic: %s", top_document.get('metadata', {}).get('topic', 'Unknown'))
                 
                 # Prepare the single document for context
+                # Stable id: the Qdrant point id, or a digest of the text if there isn't one
+                text = top_document.get("text", "")
+                metadata = top_document.get("metadata", {})
+                doc_id = top_document.get("id") or hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
                 enhanced_context = [{
-                    "id": "doc_0",
-                    "text": top_document.get("text", ""),
-                    "metadata": top_document.get("metadata", {}),
-                    "score": top_document.get("score", 0.0)
+                    "id": doc_id,
+                    "text": text,
+                    "metadata": metadata,
+                    "score": top_score
                 }]
                 
                 # Prepare source info for citation
-                metadata = top_document.get("metadata", {})
-                topic = metadata.get("topic", "Unknown")
-                source_type = metadata.get("source", "")
-                
-                # Get filename from metadata - only knowledge_base files have this
-                filename = metadata.get("filename")
-                
-                # Only consider it a valid file if:
-                # 1. Filename exists in metadata
-                # 2. Filename is not "Unknown"
-                # 3. Source is not "original" (original test docs don't have files)
-                has_file = (
-                    filename is not None 
-                    and filename != "Unknown" 
-                    and source_type != "original"
-                )
-                
-                # If no valid filename, set to None
-                if not has_file:
-                    filename = None
-                
-                top_source_info = {
-                    "type": "knowledge_base",
-                    "topic": topic,
-                    "category": metadata.get("category", "Unknown"),
-                    "filename": filename,  # None for sources without files
-                    "score": top_document.get("score", 0.0),
-                    "relevance_score": f"{top_document.get('score', 0.0):.3f}",
-                    "has_file": has_file  # Explicit flag to indicate if file exists
-                }
+                top_source_info = self._build_source_info(metadata, top_score, text)
             else:
                 enhanced_context = []
-                print("DEBUG: No documents found in knowledge base")
+                logger.debug("No documents found in knowledge base")
         except Exception as e:
-            print(f"WARNING: Error during RAG retrieval: {e}")
+            logger.warning("Error during RAG retrieval: %s", e)
             enhanced_context = []
         
+        return enhanced_context, top_source_info
+    
+    @staticmethod
+    def _build_source_info(metadata: Dict[str, Any], score: float, text: str) -> Dict[str, Any]:
+        """Citation info for a knowledge base document, as shown in the UI."""
+        filename = metadata.get("filename")
+        
+        # Only consider it a valid file if:
+        # 1. Filename exists in metadata
+        # 2. Filename is not "Unknown"
+        # 3. Source is not "original" (original test docs don't have files)
+        has_file = (
+            filename is not None
+            and filename != "Unknown"
+            and metadata.get("source", "") != "original"
+        )
+        
+        return {
+            "type": "knowledge_base",
+            "topic": metadata.get("topic", "Unknown"),
+            "category": metadata.get("category", "Unknown"),
+            "filename": filename if has_file else None,  # None for sources without files
+            "score": score,
+            "relevance_score": f"{score:.3f}",
+            "has_file": has_file,  # Explicit flag to indicate if file exists
+            # Short preview for UI (first 300 chars)
+            "text_preview": text[:300] + "..." if len(text) > 300 else text
+        }
+    
+    async def _web_search(self, query: str, query_embedding=None) -> Optional[str]:
+        """Run the web search tool, returning None if it fails.
+        
+        Successful results are cached briefly per normalized query so retyped or
+        repeated prompts don't pay for another Brave round-trip. Errors and fallbacks
+        after a failed source are not cached, so an outage isn't replayed. When the
+        query embedding is available, near-duplicate queries are served from a
+        semantic cache too.
+        """
+        key = " ".join(query.lower().split())
+        cached = self._web_search_cache.get(key)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._web_search_cache.move_to_end(key)
+                logger.debug("Using cached web search results")
+                return result
+            del self._web_search_cache[key]
+        
+        if query_embedding is not None:
+            similar = await self._web_search_semantic_cache.lookup(query_embedding, "web_search")
+            if similar is not None:
+                logger.debug("Using web search results of a similar query")
+                return similar["result"]
+        
+        logger.debug("Query appears to need current information, fetching web search...")
+        try:
+            web_search_result = await self.tool_gateway.execute_tool(
+                tool_name="web_search",
+                arguments={"query": query}
+            )
+            logger.debug("Web search completed")
+        except Exception as tool_err:
+            logger.warning("Web search failed: %s", tool_err)
+            return None
+        
+        if is_successful_result(web_search_result):
+            self._web_search_cache[key] = (time.monotonic() + self._web_search_cache_ttl, web_search_result)
+            self._web_search_cache.move_to_end(key)
+            if len(self._web_search_cache) > self._web_search_cache_size:
+                self._web_search_cache.popitem(last=False)
+            if query_embedding is not None:
+                await self._web_search_semantic_cache.store(query_embedding, {"result": web_search_result}, "web_search")
+        return web_search_result
+    
+    async def _prepare_messages(self, query: str, chat_history: List[Dict[str, str]] = None, query_embedding=None):
+        """Run retrieval and web search and build the LLM messages.
+        
+        Returns (messages, enhanced_context, top_source_info, web_search_result).
+        """
+        # Determine if we need web search (expanded triggers for more comprehensive answers)
+        needs_web_search = _WEB_TRIGGER_RE.search(query) is not None
+        
+        # Web search only depends on the query, so start it before retrieval and let them overlap
+        web_task = asyncio.create_task(self._web_search(query, query_embedding)) if needs_web_search else None
+        if not needs_web_search:
+            logger.debug("Using knowledge base only (no web search needed)")
+        
+        # Retrieval is blocking (Qdrant client), so keep it off the event loop. There is
+        # no embedding when the encoder failed or nothing needed one.
+        if query_embedding is not None:
+            enhanced_context, top_source_info = await asyncio.to_thread(self._retrieve, query_embedding)
+        else:
+            enhanced_context, top_source_info = [], None
+        web_search_result = await web_task if web_task else None
+        
         # Prepare conversation context
         messages = []
         if chat_history:
@@ -117,82 +471,12 @@ class ChatService:
                     messages.append({"role": "assistant", "content": msg["assistant"]})
         
         # Create knowledge base context from top document only
-        # Limit context to prevent sending entire documents (max 2000 characters for context)
+        # Limit context to prevent sending entire documents (max MAX_CONTEXT_TOKENS tokens)
         context_str = ""
         if enhanced_context and len(enhanced_context) > 0:
             # Use only the top document (highest score)
-            top_doc = enhanced_context[0]
-            full_text = top_doc["text"]
-            
-            # Create a limited context for the LLM (first 2000 characters)
             # This prevents the LLM from repeating the entire document
-            if len(full_text) > 2000:
-                context_str = full_text[:2000] + "..."
-            else:
-                context_str = full_text
-            
-            # Get source information for citation (fallback if not already set)
-            if top_source_info is None:
-                metadata = top_doc.get("metadata", {})
-                topic = metadata.get("topic", "Unknown")
-                source_type = metadata.get("source", "")
-                
-                # Get filename from metadata - only knowledge_base files have this
-                filename = metadata.get("filename")
-                
-                # Only consider it a valid file if:
-                # 1. Filename exists in metadata
-                # 2. Filename is not "Unknown"
-                # 3. Source is not "original" (original test docs don't have files)
-                has_file = (
-                    filename is not None 
-                    and filename != "Unknown" 
-                    and source_type != "original"
-                )
-                
-                # If no valid filename, set to None
-                if not has_file:
-                    filename = None
-                
-                # Create text preview for source display (first 300 chars)
-                preview_text = full_text[:300] + "..." if len(full_text) > 300 else full_text
-                
-                top_source_info = {
-                    "type": "knowledge_base",
-                    "topic": topic,
-                    "category": metadata.get("category", "Unknown"),
-                    "filename": filename,  # None for sources without files
-                    "score": top_doc.get("score", 0.0),
-                    "relevance_score": f"{top_doc.get('score', 0.0):.3f}",
-                    "has_file": has_file,  # Explicit flag to indicate if file exists
-                    "text_preview": preview_text  # Short preview for UI
-                }
-            else:
-                # Add text preview to existing top_source_info if not already set
-                if 'text_preview' not in top_source_info:
-                    preview_text = full_text[:300] + "..." if len(full_text) > 300 else full_text
-                    top_source_info['text_preview'] = preview_text
-        
-        # Determine if we need web search (expanded triggers for more comprehensive answers)
-        needs_web_search = any(keyword in query.lower() for keyword in [
-            'current', 'latest', 'today', 'recent', 'now', '2024', '2025', 'breaking', 'news',
-            'more', 'additional', 'expand', 'elaborate', 'details', 'comprehensive', 'complete',
-            'update', 'new', 'advance', 'development', 'trend', 'state of', 'overview'
-        ])
-        
-        web_search_result = None
-        if needs_web_search:
-            print(f"WEB DEBUG: Query appears to need current information, fetching web search...")
-            try:
-                web_search_result = await self.tool_gateway.execute_tool(
-                    tool_name="web_search",
-                    arguments={"query": query}
-                )
-                print(f"WEB DEBUG: Web search completed")
-            except Exception as tool_err:
-                print(f"WEB DEBUG: Web search failed: {tool_err}")
-        else:
-            print(f"KB DEBUG: Using knowledge base only (no web search needed)")
+            context_str = _truncate_to_tokens(enhanced_context[0]["text"], MAX_CONTEXT_TOKENS)
         
         # Create system message with single top source
         source_name = "the knowledge base"
@@ -202,49 +486,26 @@ class ChatService:
             if source_category:
                 source_name += f" (Category: {source_category})"
         
-        if context_str and web_search_result:
-            system_content = f"""You are a helpful AI assistant with access to a knowledge base and current web information.
-
-PRIMARY SOURCE (Highest Matching Document from Knowledge Base):
-Source: {source_name}
-Relevance Score: {top_source_info.get('relevance_score', 'N/A') if top_source_info else 'N/A'}
-
-RELEVANT CONTENT FROM PRIMARY SOURCE (excerpt):
-{context_str}
-
-CURRENT WEB INFORMATION (Supplementary):
-{web_search_result}
-
-INSTRUCTIONS:
-1. Provide a CONCISE, natural answer based on the knowledge base content above
-2. DO NOT repeat or copy the entire document - only use relevant information that answers the user's question
-3. Use web information only to supplement or provide additional context if needed
-4. ALWAYS cite the source: Mention "{source_name}" in your response (e.g., "According to {source_name}, ...")
-5. Keep your response focused and answer only what was asked
-6. If the primary source doesn't fully answer the question, acknowledge this and use web information to fill gaps
-7. The user can click on the source to view the full document if they need more details"""
-        elif context_str:
-            system_content = f"""You are a helpful AI assistant with access to a knowledge base.
-
-PRIMARY SOURCE (Highest Matching Document):
-Source: {source_name}
-Relevance Score: {top_source_info.get('relevance_score', 'N/A') if top_source_info else 'N/A'}
-
-RELEVANT CONTENT FROM SOURCE (excerpt):
-{context_str}
-
-INSTRUCTIONS:
-1. Provide a CONCISE, natural answer based on the content provided above
-2. DO NOT repeat or copy the entire document - only extract and present relevant information that answers the user's question
-3. ALWAYS cite the source at the beginning or end of your response
-4. Format your response naturally: "According to {source_name}, [your concise answer]" or "[your concise answer] (Source: {source_name})"
-5. Keep your response focused - answer only what was asked, not everything in the document
-6. If the source doesn't contain enough information to fully answer the question, acknowledge this limitation
-7. Do not make up information not in the provided source
-8. The user can click on the source citation to view the full document if they need more details
-9. Your answer should be brief and to the point - the full document is available if the user wants to read it"""
+        if context_str:
+            relevance_score = top_source_info.get('relevance_score', 'N/A') if top_source_info else 'N/A'
+            if web_search_result:
+                instructions, sources = _INSTRUCTIONS_KB_AND_WEB, _SOURCES_KB_AND_WEB
+            else:
+                instructions, sources = _INSTRUCTIONS_KB_ONLY, _SOURCES_KB_ONLY
+            system_content = instructions + sources.substitute(
+                source_name=source_name,
+                relevance_score=relevance_score,
+                context=context_str,
+                web=""
+            )
+            # The excerpt is already capped, so the web results are the only unbounded
+            # part; give them what's left of the system prompt budget
+            if web_search_result:
+                web_budget = MAX_SYSTEM_PROMPT_TOKENS - _count_tokens(system_content)
+                if web_budget > 0:
+                    system_content += _truncate_to_tokens(web_search_result, web_budget)
         else:
-            system_content = """You are a helpful AI assistant. The knowledge base search didn't return relevant results for this query. Please provide a general answer based on your training data and mention that you don't have specific information in your knowledge base for this topic."""
+            system_content = _PROMPT_NO_CONTEXT
         
         system_message = {
             "role": "system",
@@ -253,29 +514,71 @@ INSTRUCTIONS:
         
         messages = [system_message] + messages + [{"role": "user", "content": query}]
         
-        # Check if API key is configured before making the request
-        if not settings.OPENROUTER_API_KEY or settings.OPENROUTER_API_KEY == "your-openrouter-api-key-here":
+        return messages, enhanced_context, top_source_info, web_search_result
+    
+    def _api_key_error_response(self, enhanced_context: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Response returned when OPENROUTER_API_KEY is missing."""
+        error_msg = (
+            "OPENROUTER_API_KEY is not configured. "
+            "Please set your API key in the .env file. "
+            "Get your API key from: https://openrouter.ai/keys"
+        )
+        logger.error(error_msg)
+        return {
+            "response": error_msg,
+            "context": enhanced_context,
+            "sources": [],
+            "metadata": {
+                "model": LLM_MODEL,
+                "error": "API key not configured",
+            }
+        }
+    
+    def _api_error_response(self, error: Exception, enhanced_context: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Response returned when the OpenRouter call fails."""
+        error_str = str(error)
+        logger.warning("OpenRouter API call failed: %s", error_str)
+        
+        # Provide more helpful error messages
+        if "401" in error_str or "No auth credentials" in error_str or "Invalid API key" in error_str or "Unauthorized" in error_str:
             error_msg = (
-                "OPENROUTER_API_KEY is not configured. "
-                "Please set your API key in the .env file. "
+                "Authentication failed. Please check your OPENROUTER_API_KEY in the .env file. "
+                "Make sure it's set correctly (without quotes) and restart the server after updating it. "
                 "Get your API key from: https://openrouter.ai/keys"
             )
-            print(f"ERROR: {error_msg}")
-            return {
-                "response": error_msg,
-                "context": enhanced_context,
-                "sources": [],
-                "metadata": {
-                    "model": "openai/gpt-3.5-turbo",
-                    "error": "API key not configured",
-                }
+        elif "403" in error_str or "Forbidden" in error_str:
+            error_msg = (
+                "Access forbidden. Please check your OpenRouter API key permissions and account status. "
+                "Visit https://openrouter.ai to verify your account."
+            )
+        else:
+            error_msg = f"API Error: {error_str}. Please check your API key and try again."
+        
+        return {
+            "response": error_msg,
+            "context": enhanced_context,
+            "sources": [],
+            "metadata": {
+                "model": LLM_MODEL,
+                "error": error_str,
             }
+        }
+    
+    async def _generate_response(self, query: str, chat_history: List[Dict[str, str]] = None, query_embedding=None) -> Dict[str, Any]:
+        """Generate a response using RAG and OpenRouter with tool execution."""
+        messages, enhanced_context, top_source_info, web_search_result = await self._prepare_messages(
+            query, chat_history, query_embedding
+        )
+        
+        # Check if API key is configured before making the request
+        if not self.api_key_configured:
+            return self._api_key_error_response(enhanced_context)
         
         # Generate response using OpenRouter
         try:
-            print(f"DEBUG: Generating response with OpenRouter...")
-            response = self.openai_client.chat.completions.create(
-                model="openai/gpt-3.5-turbo",  # Using GPT-3.5 Turbo which is more reliable
+            logger.debug("Generating response with OpenRouter...")
+            response = await self.openai_client.chat.completions.create(
+                model=LLM_MODEL,  # Using GPT-3.5 Turbo which is more reliable
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500  # Reduced to encourage concise responses
@@ -288,44 +591,33 @@ INSTRUCTIONS:
             # We'll format it in the frontend for better presentation
             
         except Exception as e:
-            error_str = str(e)
-            print(f"DEBUG: OpenRouter API call failed: {error_str}")
-            
-            # Provide more helpful error messages
-            if "401" in error_str or "No auth credentials" in error_str or "Invalid API key" in error_str or "Unauthorized" in error_str:
-                error_msg = (
-                    "Authentication failed. Please check your OPENROUTER_API_KEY in the .env file. "
-                    "Make sure it's set correctly (without quotes) and restart the server after updating it. "
-                    "Get your API key from: https://openrouter.ai/keys"
-                )
-            elif "403" in error_str or "Forbidden" in error_str:
-                error_msg = (
-                    "Access forbidden. Please check your OpenRouter API key permissions and account status. "
-                    "Visit https://openrouter.ai to verify your account."
-                )
-            else:
-                error_msg = f"API Error: {error_str}. Please check your API key and try again."
-            
-            return {
-                "response": error_msg,
-                "context": enhanced_context,
-                "sources": [],
-                "metadata": {
-                    "model": "openai/gpt-3.5-turbo",
-                    "error": error_str,
-                }
-            }
+            return self._api_error_response(e, enhanced_context)
         
+        return self._build_result(
+            query, response_text, enhanced_context, top_source_info, web_search_result,
+            model=response.model, total_tokens=response.usage.total_tokens
+        )
+    
+    def _build_result(
+        self,
+        query: str,
+        response_text: str,
+        enhanced_context: List[Dict[str, Any]],
+        top_source_info: Optional[Dict[str, Any]],
+        web_search_result: Optional[str],
+        model: str,
+        total_tokens: Optional[int]
+    ) -> Dict[str, Any]:
+        """Assemble the response payload with sources and metadata."""
         # Prepare sources - only include the top matching document
         sources_list = []
         
         # Add only the top matching knowledge base source
         if top_source_info:
-            print(f"DEBUG: Preparing top source for citation: {top_source_info.get('topic', 'Unknown')}")
             sources_list.append(top_source_info)
-            print(f"   Added source: {top_source_info.get('topic')} (Score: {top_source_info.get('relevance_score', 'N/A')})")
+            logger.debug("Added source: %s (Score: %s)", top_source_info.get('topic'), top_source_info.get('relevance_score', 'N/A'))
         else:
-            print("DEBUG: No top source available for citation")
+            logger.debug("No top source available for citation")
         
         # Add web search source if used (as supplementary)
         if web_search_result:
@@ -335,17 +627,17 @@ INSTRUCTIONS:
                 "query": query,
                 "note": "Supplementary information"
             })
-            print(f"DEBUG: Added web search as supplementary source")
+            logger.debug("Added web search as supplementary source")
         
-        print(f"DEBUG: Total sources in response: {len(sources_list)} (Primary: {len([s for s in sources_list if s.get('type') == 'knowledge_base'])})")
+        logger.debug("Total sources in response: %d (Primary: %d)", len(sources_list), 1 if top_source_info else 0)
         
         return {
             "response": response_text,
             "context": enhanced_context,  # Contains only the top matching document
             "sources": sources_list,  # Contains only the top source for citation
             "metadata": {
-                "model": response.model,
-                "total_tokens": response.usage.total_tokens,
+                "model": model,
+                "total_tokens": total_tokens,
                 "rag_documents_used": 1 if enhanced_context else 0,  # Only top document
                 "top_match_score": enhanced_context[0].get("score", 0.0) if enhanced_context else None,
                 "web_search_used": bool(web_search_result),
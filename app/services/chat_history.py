@@ -1,48 +1,154 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import selectinload
+from sqlalchemy import delete, desc, func, insert, select, text, true, update
+from typing import List, Optional, Tuple
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.models.chat_models import Conversation, Message, MessageRole
 from app.models.schemas import ConversationCreate, ConversationUpdate, MessageCreate
 
 
+# Message roles are stored as enum member names (USER/ASSISTANT); the API exposes the values
+_CONVERSATION_JSON_QUERY = text("""
+    SELECT json_build_object(
+        'id', c.id,
+        'title', c.title,
+        'created_at', c.created_at,
+        'updated_at', c.updated_at,
+        'user_id', c.user_id,
+        'messages', COALESCE(
+            (
+                SELECT json_agg(json_build_object(
+                    'id', m.id,
+                    'conversation_id', m.conversation_id,
+                    'role', lower(m.role::text),
+                    'content', m.content,
+                    'created_at', m.created_at,
+                    'metadata', COALESCE(m.message_data, '{}')
+                ) ORDER BY m.created_at)
+                FROM messages m
+                WHERE m.conversation_id = c.id
+            ),
+            '[]'::json
+        )
+    )::text
+    FROM conversations c
+    WHERE c.id = :conversation_id
+""")
+
+
 class ChatHistoryService:
     """Service for managing chat history and conversations"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create_conversation(self, title: str, user_id: Optional[str] = None) -> Conversation:
+    async def create_conversation(self, title: str, user_id: Optional[str] = None) -> Conversation:
         """Create a new conversation"""
         conversation = Conversation(
             title=title,
             user_id=user_id
         )
         self.db.add(conversation)
-        self.db.commit()
-        self.db.refresh(conversation)
+        # All column defaults are generated client-side and the session doesn't expire
+        # on commit, so the object is complete without a refresh round-trip
+        await self.db.commit()
         return conversation
 
-    def get_conversation(self, conversation_id: UUID) -> Optional[Conversation]:
+    async def get_conversation(self, conversation_id: UUID) -> Optional[Conversation]:
         """Get a conversation by ID"""
-        return self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        result = await self.db.execute(select(Conversation).where(Conversation.id == conversation_id))
+        return result.scalars().first()
 
-    def get_conversation_with_messages(self, conversation_id: UUID) -> Optional[Conversation]:
+    async def get_conversation_with_messages(self, conversation_id: UUID) -> Optional[Conversation]:
         """Get a conversation with all its messages"""
-        return self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        result = await self.db.execute(
+            select(Conversation)
+            .options(selectinload(Conversation.messages))
+            .where(Conversation.id == conversation_id)
+        )
+        return result.scalars().first()
 
-    def list_conversations(self, user_id: Optional[str] = None, limit: int = 50) -> List[Conversation]:
+    async def get_conversation_json(self, conversation_id: UUID) -> Optional[str]:
+        """Get a conversation with all its messages, serialized to JSON by Postgres.
+
+        The shape matches ``ConversationWithMessages`` so the result can be returned
+        as-is, without ORM hydration or Pydantic validation.
+        """
+        result = await self.db.execute(_CONVERSATION_JSON_QUERY, {"conversation_id": conversation_id})
+        return result.scalar()
+
+    async def list_conversations(self, user_id: Optional[str] = None, limit: int = 50) -> List[Conversation]:
         """List all conversations, optionally filtered by user_id"""
-        query = self.db.query(Conversation)
+        query = select(Conversation)
+        if user_id:
+            query = query.where(Conversation.user_id == user_id)
+        result = await self.db.execute(query.order_by(desc(Conversation.updated_at)).limit(limit))
+        return list(result.scalars().all())
+
+    async def get_conversations_version(self, user_id: Optional[str] = None) -> Tuple[Optional[datetime], int]:
+        """Get ``(max(updated_at), count)`` of conversations - changes whenever the list does"""
+        query = select(func.max(Conversation.updated_at), func.count(Conversation.id))
         if user_id:
-            query = query.filter(Conversation.user_id == user_id)
-        return query.order_by(desc(Conversation.updated_at)).limit(limit).all()
+            query = query.where(Conversation.user_id == user_id)
+        result = await self.db.execute(query)
+        latest, count = result.one()
+        return latest, count
+
+    async def list_conversation_summaries(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 50,
+        preview_length: int = 100
+    ) -> List[Row]:
+        """List conversations with their message count and last message in a single query.
+
+        Each row has ``id``, ``title``, ``updated_at``, ``message_count`` and ``last_message``.
+        Only the first ``preview_length + 1`` characters of the last message are fetched,
+        enough for the caller to tell whether it was truncated.
+        """
+        # Pick the page of conversations first so the per-conversation work below
+        # only runs for the rows actually returned
+        recent = select(Conversation.id, Conversation.title, Conversation.updated_at)
+        if user_id:
+            recent = recent.where(Conversation.user_id == user_id)
+        recent = recent.order_by(desc(Conversation.updated_at)).limit(limit).cte("recent")
+
+        # Message counts for the whole page in one grouped scan over an IN list
+        message_counts = (
+            select(Message.conversation_id, func.count(Message.id).label("message_count"))
+            .where(Message.conversation_id.in_(select(recent.c.id)))
+            .group_by(Message.conversation_id)
+            .subquery("message_counts")
+        )
+        last_message = (
+            select(func.substr(Message.content, 1, preview_length + 1).label("content"))
+            .where(Message.conversation_id == recent.c.id)
+            .order_by(desc(Message.created_at))
+            .limit(1)
+            .correlate(recent)
+            .lateral("last_message")
+        )
+        query = (
+            select(
+                recent.c.id,
+                recent.c.title,
+                recent.c.updated_at,
+                func.coalesce(message_counts.c.message_count, 0).label("message_count"),
+                last_message.c.content.label("last_message"),
+            )
+            .outerjoin(message_counts, message_counts.c.conversation_id == recent.c.id)
+            .outerjoin(last_message, true())
+            .order_by(desc(recent.c.updated_at))
+        )
+        result = await self.db.execute(query)
+        return list(result.all())
 
-    def update_conversation(self, conversation_id: UUID, update_data: ConversationUpdate) -> Optional[Conversation]:
+    async def update_conversation(self, conversation_id: UUID, update_data: ConversationUpdate) -> Optional[Conversation]:
         """Update a conversation"""
-        conversation = self.get_conversation(conversation_id)
+        conversation = await self.get_conversation(conversation_id)
         if not conversation:
             return None
 
@@ -50,21 +156,20 @@ class ChatHistoryService:
             conversation.title = update_data.title
             conversation.updated_at = datetime.utcnow()
 
-        self.db.commit()
-        self.db.refresh(conversation)
+        # Every changed column was set here and the session doesn't expire on commit,
+        # so the object is already current without a refresh
+        await self.db.commit()
         return conversation
 
-    def delete_conversation(self, conversation_id: UUID) -> bool:
+    async def delete_conversation(self, conversation_id: UUID) -> bool:
         """Delete a conversation and all its messages"""
-        conversation = self.get_conversation(conversation_id)
-        if not conversation:
-            return False
+        # Two set-based DELETEs in one transaction; the messages never need to be loaded
+        await self.db.execute(delete(Message).where(Message.conversation_id == conversation_id))
+        result = await self.db.execute(delete(Conversation).where(Conversation.id == conversation_id))
+        await self.db.commit()
+        return result.rowcount > 0
 
-        self.db.delete(conversation)
-        self.db.commit()
-        return True
-
-    def add_message(
+    async def add_message(
         self,
         conversation_id: UUID,
         role: str,
@@ -80,21 +185,73 @@ class ChatHistoryService:
         )
         self.db.add(message)
 
-        # Update conversation's updated_at timestamp
-        conversation = self.get_conversation(conversation_id)
-        if conversation:
-            conversation.updated_at = datetime.utcnow()
+        # Update conversation's updated_at timestamp in the same transaction, without loading it
+        await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(updated_at=datetime.utcnow())
+        )
 
-        self.db.commit()
-        self.db.refresh(message)
+        # Column defaults are generated client-side, so no refresh is needed
+        await self.db.commit()
         return message
 
-    def get_messages(self, conversation_id: UUID, limit: Optional[int] = None) -> List[Message]:
+    async def add_messages(
+        self,
+        rows: List[Tuple[UUID, str, str, Optional[dict]]],
+        batch_size: int = 1000
+    ) -> None:
+        """Add several messages with multi-row INSERTs and a single commit.
+
+        Each row is ``(conversation_id, role, content, metadata)``. Rows are given
+        strictly increasing timestamps so they keep their order when read back.
+        Large imports are sent ``batch_size`` rows per INSERT statement.
+        """
+        if not rows:
+            return
+
+        now = datetime.utcnow()
+        params = [
+            {
+                "conversation_id": conversation_id,
+                "role": MessageRole(role),
+                "content": content,
+                "message_data": metadata or {},
+                "created_at": now + timedelta(microseconds=i),
+            }
+            for i, (conversation_id, role, content, metadata) in enumerate(rows)
+        ]
+        for start in range(0, len(params), batch_size):
+            await self.db.execute(
+                insert(Message).execution_options(insertmanyvalues_page_size=batch_size),
+                params[start:start + batch_size]
+            )
+
+        # Update the updated_at timestamp of every conversation touched in one statement
+        await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id.in_({row[0] for row in rows}))
+            .values(updated_at=now)
+        )
+
+        await self.db.commit()
+
+    async def get_messages(self, conversation_id: UUID, limit: Optional[int] = None) -> List[Message]:
         """Get messages for a conversation"""
-        query = self.db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at)
+        query = select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at)
         if limit:
             query = query.limit(limit)
-        return query.all()
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def get_message_contents(self, conversation_id: UUID) -> List[Row]:
+        """Get ``(role, content)`` rows for a conversation in order, without building ORM objects"""
+        result = await self.db.execute(
+            select(Message.role, Message.content)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at)
+        )
+        return list(result.all())
 
     def generate_conversation_title(self, first_message: str, max_length: int = 50) -> str:
         """Generate a title from the first message"""
@@ -103,4 +260,3 @@ class ChatHistoryService:
         if len(title) > max_length:
             title = title[:max_length].rsplit(' ', 1)[0] + "..."
         return title or "New Conversation"
-
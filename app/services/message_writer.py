@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from app.models import database
+from app.services.chat_history import ChatHistoryService
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """Buffers chat messages in a queue and persists them off the request path.
+
+    A single background worker drains the queue so the chat endpoint can return
+    as soon as the LLM response is ready instead of waiting on database writes.
+    """
+
+    def __init__(self, maxsize: int = 500) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Spawn the background worker. Must be called from a running event loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._drain())
+
+    def enqueue(self, rows: List[Tuple[UUID, str, str, Optional[dict]]]) -> bool:
+        """Queue a batch of ``(conversation_id, role, content, metadata)`` rows without blocking.
+
+        Returns False if the batch was dropped because the queue is full.
+        """
+        try:
+            self.queue.put_nowait(rows)
+            return True
+        except asyncio.QueueFull:
+            # Apply back-pressure by dropping rather than stalling the request
+            self.dropped += 1
+            logger.warning("Message write queue full, dropped batch (%d dropped so far)", self.dropped)
+            return False
+
+    async def _drain(self) -> None:
+        """Persist queued batches one at a time, in the order they were enqueued."""
+        while True:
+            rows = await self.queue.get()
+            try:
+                if database.AsyncSessionLocal is not None:
+                    async with database.AsyncSessionLocal() as db:
+                        await ChatHistoryService(db).add_messages(rows)
+            except Exception as e:
+                logger.warning("Could not save messages to database: %s", e)
+            finally:
+                self.queue.task_done()
+
+    async def stop(self) -> None:
+        """Flush pending writes and stop the background worker."""
+        if self._worker is None:
+            return
+        await self.queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
@@ -1,31 +1,136 @@
 import networkx as nx # networkx is a library for creating and manipulating graphs
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from sentence_transformers import util
 
 class GraphRAG:
-    def __init__(self):
+    def __init__(self, similarity_threshold: float = 0.7):
         self.graph = nx.Graph()
-        self.embeddings = {}
         self.texts = {}
+        self.similarity_threshold = similarity_threshold
+        # L2-normalized embeddings, one row per document, so linking a new document
+        # is a single matrix-vector product instead of one cos_sim call per pair.
+        # Capacity grows by doubling; only the first _count rows are in use.
+        self._matrix = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        # Per-document (-similarity, neighbor) lists kept sorted as edges are added,
+        # so relationship lookups don't sort on every call
+        self._sorted_neighbors: Dict[str, List[Tuple[float, str]]] = {}
+        # add_document may be called from worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
         
+    def get_embedding(self, doc_id: str) -> Optional[np.ndarray]:
+        """The stored (L2-normalized, float32) embedding of a document, or None."""
+        row = self._rows.get(doc_id)
+        return None if row is None else self._matrix[row]
+    
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.texts
+    
+    def _store_vector(self, doc_id: str, unit: np.ndarray) -> int:
+        """Write a normalized embedding into the matrix, returning its row."""
+        row = self._rows.get(doc_id)
+        if row is None:
+            if self._matrix is None:
+                self._matrix = np.empty((16, unit.shape[0]), dtype=np.float32)
+            elif self._count == self._matrix.shape[0]:
+                grown = np.empty((self._count * 2, self._matrix.shape[1]), dtype=np.float32)
+                grown[:self._count] = self._matrix
+                self._matrix = grown
+            row = self._count
+            self._count += 1
+            self._ids.append(doc_id)
+            self._rows[doc_id] = row
+        self._matrix[row] = unit
+        return row
+    
+    def _unlink(self, doc_id: str) -> None:
+        """Drop a document's similarity edges (used before relinking changed content)."""
+        for neighbor in self.graph.adj[doc_id]:
+            self._sorted_neighbors[neighbor] = [
+                entry for entry in self._sorted_neighbors.get(neighbor, []) if entry[1] != doc_id
+            ]
+        self.graph.remove_edges_from(list(self.graph.edges(doc_id)))
+        self._sorted_neighbors[doc_id] = []
+    
     def add_document(self, doc_id: str, text: str, embedding: np.ndarray, metadata: Dict[str, Any] = None):
-        """Add a document to the graph."""
-        self.graph.add_node(doc_id, text=text, metadata=metadata or {})
-        self.embeddings[doc_id] = embedding
-        self.texts[doc_id] = text
+        """Add a document to the graph.
+        
+        Idempotent: re-adding a known document with the same text only refreshes its
+        metadata. If the text changed, its edges are rebuilt from the new embedding.
+        """
+        self.add_documents([doc_id], [text], [embedding], [metadata])
+    
+    def add_documents(
+        self,
+        doc_ids: List[str],
+        texts: List[str],
+        embeddings: List[np.ndarray],
+        metadatas: List[Dict[str, Any]] = None,
+        block_size: int = 4096
+    ):
+        """Add a batch of documents, linking them with blocked matrix products.
+        
+        Similarities for the new documents are computed ``block_size`` rows at a time
+        against every stored document, which bounds peak memory to block_size x N.
+        Same idempotency rules as add_document().
+        """
+        if not doc_ids:
+            return
+        if metadatas is None:
+            metadatas = [None] * len(doc_ids)
+        
+        units = np.asarray(embeddings, dtype=np.float32).reshape(len(doc_ids), -1)
+        norms = np.linalg.norm(units, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        units = units / norms
         
-        # Create edges between similar documents
-        for existing_id in self.embeddings:
-            if existing_id != doc_id:
-                similarity = util.cos_sim(
-                    embedding.reshape(1, -1),
-                    self.embeddings[existing_id].reshape(1, -1)
-                ).item()
+        with self._lock:
+            new_rows = []
+            new_row_set = set()
+            for doc_id, text, metadata, unit in zip(doc_ids, texts, metadatas, units):
+                if doc_id in self.texts:
+                    if self.texts[doc_id] == text:
+                        self.graph.nodes[doc_id]["metadata"] = metadata or {}
+                        continue
+                    # Content changed - drop stale similarity edges before relinking
+                    self._unlink(doc_id)
                 
-                # Add edge if similarity is above threshold
-                if similarity > 0.7:  # Configurable threshold
-                    self.graph.add_edge(doc_id, existing_id, weight=similarity)
+                self.graph.add_node(doc_id, text=text, metadata=metadata or {})
+                self.texts[doc_id] = text
+                row = self._store_vector(doc_id, unit)
+                if row not in new_row_set:  # the same id may repeat within a batch
+                    new_rows.append(row)
+                    new_row_set.add(row)
+            
+            if not new_rows:
+                return
+            
+            # Create edges between similar documents. A pair of two new documents shows
+            # up from both sides, so keep it only from the lower row.
+            edges = []
+            for start in range(0, len(new_rows), block_size):
+                block = new_rows[start:start + block_size]
+                similarities = self._matrix[block] @ self._matrix[:self._count].T
+                for i, col in zip(*np.nonzero(similarities > self.similarity_threshold)):
+                    row, col = block[i], int(col)
+                    if col == row or (col in new_row_set and col < row):
+                        continue
+                    edges.append((self._ids[row], self._ids[col], float(similarities[i, col])))
+            
+            self.graph.add_weighted_edges_from(edges)
+            
+            touched = set()
+            for a, b, weight in edges:
+                self._sorted_neighbors.setdefault(a, []).append((-weight, b))
+                self._sorted_neighbors.setdefault(b, []).append((-weight, a))
+                touched.update((a, b))
+            for doc_id in touched:
+                self._sorted_neighbors[doc_id].sort()
+            for row in new_rows:
+                self._sorted_neighbors.setdefault(self._ids[row], [])
     
     def get_context(self, relevant_docs: List[str], depth: int = 1) -> List[Dict[str, Any]]:
         """Get context by exploring the graph around relevant documents."""
@@ -34,22 +139,10 @@ class GraphRAG:
         
         context = set(relevant_docs)
         
-        # Explore neighbors up to specified depth
-        neighbors = set()  # Initialize neighbors set outside the loop
+        # Explore neighbors up to specified depth; each seed's BFS visits a node at most once
         for doc_id in relevant_docs:
-            if doc_id not in self.graph:
-                continue
-            current_neighbors = {doc_id}
-            
-            for _ in range(depth):
-                new_neighbors = set()
-                for node in current_neighbors:
-                    if node in self.graph:
-                        new_neighbors.update(self.graph.neighbors(node))
-                neighbors.update(new_neighbors)
-                current_neighbors = new_neighbors
-        
-        context.update(neighbors)
+            if doc_id in self.graph:
+                context.update(nx.single_source_shortest_path_length(self.graph, doc_id, cutoff=depth))
         
         # Return context documents with their text and metadata
         results = []
@@ -64,17 +157,22 @@ class GraphRAG:
         return results
     
     def get_document_relationships(self, doc_id: str) -> List[Dict[str, Any]]:
-        """Get related documents for a given document."""
+        """Get related documents for a given document, most similar first."""
         if doc_id not in self.graph:
             return []
         
-        relationships = []
-        for neighbor in self.graph.neighbors(doc_id):
-            relationships.append({
+        neighbors = self._sorted_neighbors.get(doc_id)
+        if neighbors is None:
+            # Edges added directly on the graph aren't indexed - sort them here
+            neighbors = sorted((-data["weight"], neighbor) for neighbor, data in self.graph.adj[doc_id].items())
+        
+        nodes = self.graph.nodes
+        return [
+            {
                 "id": neighbor,
                 "text": self.texts[neighbor],
-                "similarity": self.graph.edges[doc_id, neighbor]["weight"],
-                "metadata": self.graph.nodes[neighbor]["metadata"]
-            })
-        
-        return sorted(relationships, key=lambda x: x["similarity"], reverse=True)
+                "similarity": -neg_weight,
+                "metadata": nodes[neighbor]["metadata"]
+            }
+            for neg_weight, neighbor in neighbors
+        ]
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from app.core.config import get_settings
+
+try:
+    import redis.asyncio as aioredis
+    from redis.commands.search.field import TagField, VectorField
+    from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+    from redis.commands.search.query import Query
+except ImportError:  # redis is optional - the cache is simply disabled without it
+    aioredis = None
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Redis-backed semantic cache for chat responses.
+
+    Responses are stored next to the embedding of the query that produced them.
+    A lookup runs a KNN-1 vector search (RediSearch HNSW index) and returns the
+    stored response when the nearest query is similar enough. Entries are scoped
+    by a hash of the chat history so follow-up questions are not answered from
+    a different conversation's context.
+    """
+
+    def __init__(self, redis_url: str, namespace: str, threshold: float = 0.9, ttl: int = 3600):
+        self.client = aioredis.from_url(redis_url)
+        self.namespace = namespace
+        self.index_name = f"idx:{namespace}"
+        self.prefix = f"{namespace}:"
+        self.threshold = threshold
+        self.ttl = ttl
+        self._index_ready = False
+
+    @staticmethod
+    def history_key(chat_history: Optional[List[Dict[str, str]]]) -> str:
+        """Short, stable hash of the chat history used to scope cache entries."""
+        raw = json.dumps(chat_history or [], sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    async def _ensure_index(self, dim: int) -> None:
+        """Create the vector index on first use if it doesn't exist yet."""
+        if self._index_ready:
+            return
+        try:
+            await self.client.ft(self.index_name).info()
+        except Exception:
+            await self.client.ft(self.index_name).create_index(
+                [
+                    TagField("history"),
+                    VectorField("vec", "HNSW", {
+                        "TYPE": "FLOAT32",
+                        "DIM": dim,
+                        "DISTANCE_METRIC": "COSINE",
+                    }),
+                ],
+                definition=IndexDefinition(prefix=[self.prefix], index_type=IndexType.HASH),
+            )
+        self._index_ready = True
+
+    async def lookup(self, embedding: np.ndarray, history_key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for the nearest similar query, or None on a miss."""
+        vec = np.asarray(embedding, dtype=np.float32)
+        try:
+            await self._ensure_index(vec.shape[-1])
+            query = (
+                Query(f"(@history:{{{history_key}}})=>[KNN 1 @vec $vec AS distance]")
+                .return_fields("payload", "distance")
+                .dialect(2)
+            )
+            result = await self.client.ft(self.index_name).search(query, query_params={"vec": vec.tobytes()})
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+            return None
+
+        if not result.docs:
+            return None
+
+        doc = result.docs[0]
+        # COSINE distance is 1 - cosine similarity
+        if 1.0 - float(doc.distance) < self.threshold:
+            return None
+        return json.loads(doc.payload)
+
+    async def store(self, embedding: np.ndarray, response: Dict[str, Any], history_key: str, ttl: Optional[int] = None) -> None:
+        """Cache a response under the embedding of the query that produced it."""
+        vec = np.asarray(embedding, dtype=np.float32)
+        key = f"{self.prefix}{uuid.uuid4().hex}"
+        try:
+            await self._ensure_index(vec.shape[-1])
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping={
+                    "vec": vec.tobytes(),
+                    "history": history_key,
+                    "payload": json.dumps(response, default=str),
+                })
+                pipe.expire(key, ttl or self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Could not store response in semantic cache: %s", e)
+
+
+class InProcessSemanticCache:
+    """Per-process semantic cache used when Redis isn't configured.
+
+    Query embeddings are L2-normalized into a fixed-size float32 matrix. A
+    lookup first selects the live entries for the same conversation history
+    (vectorized compares on an expiry array and an int64 history tag array),
+    then scores only those rows with one matrix-vector product
+    (inner product == cosine similarity).
+    Slots are reused oldest-first once the cache is full. Expiry times are
+    wall-clock so entries saved with ``save()`` stay valid across a restart.
+    ``namespace`` is written with them, and ``load()`` ignores files saved
+    under a different one.
+    """
+
+    def __init__(self, threshold: float = 0.9, ttl: int = 3600, max_entries: int = 2000, namespace: str = ""):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self._vectors: Optional[np.ndarray] = None  # allocated on first store, once the dim is known
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._history = np.empty(max_entries, dtype=object)
+        self._history_tags = np.zeros(max_entries, dtype=np.int64)  # hashes of _history, compared in C
+        self._payloads: List[Optional[str]] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.RLock()
+
+    history_key = staticmethod(SemanticCache.history_key)
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def _history_tag(history_key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(history_key.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+    async def lookup(self, embedding: np.ndarray, history_key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for the nearest similar query, or None on a miss."""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._size == 0 or self._vectors.shape[1] != vec.shape[0]:
+                return None
+            valid = (self._expires[:self._size] > time.time()) & (self._history_tags[:self._size] == self._history_tag(history_key))
+            candidates = np.flatnonzero(valid)
+            if candidates.size == 0:
+                return None
+            scores = self._vectors[candidates] @ vec
+            best_index = int(np.argmax(scores))
+            best = int(candidates[best_index])
+            # The tag is a 64-bit hash, so confirm the key itself before serving
+            if scores[best_index] < self.threshold or self._history[best] != history_key:
+                return None
+            payload = self._payloads[best]
+        # Stored serialized so callers can't mutate the cached copy
+        return json.loads(payload)
+
+    async def store(self, embedding: np.ndarray, response: Dict[str, Any], history_key: str, ttl: Optional[int] = None) -> None:
+        """Cache a response under the embedding of the query that produced it."""
+        vec = self._normalize(embedding)
+        payload = json.dumps(response, default=str)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vec.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                self._size = self._next = 0
+            slot = self._next
+            self._vectors[slot] = vec
+            self._expires[slot] = time.time() + (ttl or self.ttl)
+            self._history[slot] = history_key
+            self._history_tags[slot] = self._history_tag(history_key)
+            self._payloads[slot] = payload
+            self._next = (slot + 1) % self.max_entries
+            self._size = max(self._size, slot + 1)
+
+    def save(self, path: str) -> None:
+        """Write the unexpired entries to ``<path>.npz`` (vectors) and ``<path>.json`` (payloads)."""
+        with self._lock:
+            if self._vectors is None:
+                return
+            # Oldest first, so a later load() keeps the same eviction order
+            if self._size == self.max_entries:
+                order = [(self._next + i) % self._size for i in range(self._size)]
+            else:
+                order = list(range(self._size))
+            live = [i for i in order if self._expires[i] > time.time()]
+            vectors = self._vectors[live].copy()
+            expires = self._expires[live].copy()
+            meta = [{"history_key": self._history[i], "payload": self._payloads[i]} for i in live]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Write both files under temporary names first so a crash mid-save never
+        # leaves a vectors file that doesn't match its payloads. The names are per
+        # process, so workers saving on the same shutdown don't write into each
+        # other's files.
+        npz_tmp = f"{path}.npz.{os.getpid()}.tmp"
+        json_tmp = f"{path}.json.{os.getpid()}.tmp"
+        with open(npz_tmp, "wb") as f:
+            np.savez(f, vectors=vectors, expires=expires)
+        with open(json_tmp, "wb") as f:
+            f.write(orjson.dumps({"namespace": self.namespace, "entries": meta}))
+        os.replace(npz_tmp, f"{path}.npz")
+        os.replace(json_tmp, f"{path}.json")
+        logger.info("Saved %d semantic cache entries to %s", len(live), path)
+
+    def load(self, path: str) -> None:
+        """Restore entries written by ``save()``, dropping any that expired in the meantime.
+
+        Files saved under a different namespace (another LLM or embedding model, or
+        retrieval top-k) are ignored rather than served.
+        """
+        try:
+            with open(f"{path}.json", "rb") as f:
+                sidecar = orjson.loads(f.read())
+            if not isinstance(sidecar, dict) or sidecar.get("namespace") != self.namespace:
+                logger.info("Ignoring semantic cache at %s: saved under a different namespace", path)
+                return
+            meta = sidecar["entries"]
+            with np.load(f"{path}.npz") as data:
+                vectors = data["vectors"]
+                expires = data["expires"]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Could not load semantic cache from %s: %s", path, e)
+            return
+        if len(meta) != len(vectors) or vectors.ndim != 2:
+            logger.warning("Ignoring semantic cache at %s: vectors and payloads don't match", path)
+            return
+
+        live = np.flatnonzero(expires > time.time())[-self.max_entries:]
+        with self._lock:
+            self._vectors = np.zeros((self.max_entries, vectors.shape[1]), dtype=np.float32)
+            n = len(live)
+            self._vectors[:n] = vectors[live]
+            self._expires[:] = 0
+            self._expires[:n] = expires[live]
+            for slot, i in enumerate(live):
+                self._history[slot] = meta[i]["history_key"]
+                self._history_tags[slot] = self._history_tag(meta[i]["history_key"])
+                self._payloads[slot] = meta[i]["payload"]
+            self._size = n
+            self._next = n % self.max_entries
+        logger.info("Loaded %d semantic cache entries from %s", n, path)
+
+
+_semantic_cache = None
+
+
+def get_semantic_cache(model: str, top_k: int):
+    """Get the shared semantic cache.
+
+    Uses Redis when REDIS_URL is set (shared across workers), otherwise an
+    in-process cache. The namespace (the Redis key prefix, or the tag saved with
+    the in-process cache file) includes the LLM model, embedding model and
+    retrieval top-k so changing any of them starts from an empty cache instead
+    of serving stale hits.
+    """
+    global _semantic_cache
+    if _semantic_cache is None:
+        tag = hashlib.sha1(f"{model}|{settings.EMBEDDING_MODEL}|{top_k}".encode("utf-8")).hexdigest()[:12]
+        if settings.REDIS_URL and aioredis is not None:
+            _semantic_cache = SemanticCache(
+                redis_url=settings.REDIS_URL,
+                namespace=f"chatcache:{tag}",
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                ttl=settings.SEMANTIC_CACHE_TTL,
+            )
+        else:
+            if settings.REDIS_URL:
+                logger.warning("REDIS_URL is set but the redis package isn't installed; using an in-process semantic cache")
+            _semantic_cache = InProcessSemanticCache(
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                ttl=settings.SEMANTIC_CACHE_TTL,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                namespace=f"chatcache:{tag}",
+            )
+            if settings.SEMANTIC_CACHE_PATH:
+                _semantic_cache.load(settings.SEMANTIC_CACHE_PATH)
+    return _semantic_cache
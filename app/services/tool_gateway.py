@@ -1,8 +1,11 @@
+import logging
 from typing import Any, Dict, List, Optional
 
 from app.core.config import get_settings
 from app.services.tool_service import ToolService
 
+logger = logging.getLogger(__name__)
+
 
 class ToolGateway:
     """Routes tool invocations to MCP if enabled, otherwise falls back to local ToolService.
@@ -42,9 +45,13 @@ class ToolGateway:
                 # result = await self._mcp_client.call_tool(tool_name, arguments)
                 # return result
             except Exception as mcp_error:
-                print(f"🔧 MCP error, falling back to local tool: {mcp_error}")
+                logger.warning("MCP error, falling back to local tool: %s", mcp_error)
 
         # Fallback to local ToolService
         return await self.tool_service.execute_tool(tool_name=tool_name, arguments=arguments)
 
+    async def close(self) -> None:
+        """Close the underlying tool service's HTTP client."""
+        await self.tool_service.close()
+
 
@@ -1,46 +1,94 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+import hashlib
+import httpx
+import logging
+import os
+import threading
+import uuid
 import numpy as np
 
 from app.core.config import get_settings
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 settings = get_settings()
 
+logger = logging.getLogger(__name__)
+
+# Loaded models, shared by every VectorStore in the process
+_ENCODERS: Dict[str, "SentenceTransformer"] = {}
+_ENCODER_LOCK = threading.Lock()
+
+
+def _configure_torch_threads() -> None:
+    """Let torch use every core for encoding; some server environments start it with one thread."""
+    import torch
+    torch.set_num_threads(settings.EMBEDDING_THREADS or os.cpu_count() or 4)
+    try:
+        # Only allowed before any inter-op work has run
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def get_encoder(model_name: str) -> "SentenceTransformer":
+    """Load a sentence transformer once per process and reuse it.
+    
+    sentence_transformers (and torch with it) is imported here rather than at module
+    level, so importing this module stays cheap until an embedding is needed.
+    """
+    encoder = _ENCODERS.get(model_name)
+    if encoder is None:
+        with _ENCODER_LOCK:
+            encoder = _ENCODERS.get(model_name)
+            if encoder is None:
+                logger.info("Loading embedding model: %s (%s backend)...", model_name, settings.EMBEDDING_BACKEND)
+                from sentence_transformers import SentenceTransformer
+                _configure_torch_threads()
+                model_kwargs = {}
+                if settings.EMBEDDING_BACKEND == "onnx" and settings.EMBEDDING_ONNX_FILE:
+                    model_kwargs["file_name"] = settings.EMBEDDING_ONNX_FILE
+                encoder = SentenceTransformer(
+                    model_name,
+                    backend=settings.EMBEDDING_BACKEND,
+                    model_kwargs=model_kwargs or None
+                )
+                _ENCODERS[model_name] = encoder
+                logger.info("Embedding model loaded successfully")
+    return encoder
+
+
 class VectorStore:
     def __init__(self):
         self.client = None
         # Try to connect to Qdrant, but don't block if it fails
         try:
-            # Use a very short timeout for the connection
-            import socket
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)  # 1 second timeout
-            qdrant_host = settings.QDRANT_URL.replace("http://", "").replace("https://", "").split(":")[0]
-            qdrant_port = int(settings.QDRANT_URL.split(":")[-1]) if ":" in settings.QDRANT_URL else 6333
-            result = sock.connect_ex((qdrant_host, qdrant_port))
-            sock.close()
+            # A single readiness probe with a short timeout. It replaces the raw socket
+            # check plus the extra get_collections() round-trip; the collection check
+            # below is the first real call.
+            headers = {"api-key": settings.QDRANT_API_KEY} if settings.QDRANT_API_KEY else None
+            response = httpx.get(f"{settings.QDRANT_URL.rstrip('/')}/readyz", headers=headers, timeout=1.0)
+            response.raise_for_status()
             
-            if result == 0:
-                # Port is open, try to connect
-                self.client = QdrantClient(
-                    url=settings.QDRANT_URL,
-                    api_key=settings.QDRANT_API_KEY,
-                    timeout=2  # 2 second timeout
-                )
-                # Test connection with timeout
-                self.client.get_collections()
-                print("Connected to Qdrant successfully")
-            else:
-                raise ConnectionError("Qdrant port is not open")
+            self.client = QdrantClient(
+                url=settings.QDRANT_URL,
+                api_key=settings.QDRANT_API_KEY,
+                timeout=2  # 2 second timeout
+            )
+            logger.info("Connected to Qdrant successfully")
         except Exception as e:
-            print(f"WARNING: Could not connect to Qdrant at {settings.QDRANT_URL}: {e}")
-            print("Vector search will return empty results. Please start Qdrant with: docker-compose up -d qdrant")
+            logger.warning("Could not connect to Qdrant at %s: %s", settings.QDRANT_URL, e)
+            logger.warning("Vector search will return empty results. Please start Qdrant with: docker-compose up -d qdrant")
             self.client = None
         
-        # Lazy load encoder to avoid blocking server startup
-        self._encoder = None
+        # LRU of recent embeddings keyed by a digest of the text
+        self._embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._embedding_cache_size = settings.EMBEDDING_CACHE_SIZE
+        self._embedding_cache_lock = threading.Lock()
         self.embedding_model = settings.EMBEDDING_MODEL
         self.collection_name = settings.COLLECTION_NAME
         
@@ -50,12 +98,39 @@ class VectorStore:
     
     @property
     def encoder(self):
-        """Lazy load the sentence transformer model."""
-        if self._encoder is None:
-            print(f"Loading embedding model: {self.embedding_model}...")
-            self._encoder = SentenceTransformer(self.embedding_model)
-            print("Embedding model loaded successfully")
-        return self._encoder
+        """The shared sentence transformer, loaded on first use so it doesn't block server startup."""
+        return get_encoder(self.embedding_model)
+    
+    def warmup(self) -> None:
+        """Load the encoder and run one encode, so the first query doesn't pay for either.
+        
+        Optional: without it the model still loads lazily on first use.
+        """
+        try:
+            self.encoder.encode("warmup", normalize_embeddings=True)
+        except Exception as e:
+            logger.warning("Embedding model warmup failed: %s", e)
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Encode text, reusing the embedding if the same text was encoded recently."""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._embedding_cache_lock:
+            cached = self._embedding_cache.get(key)
+            if cached is not None:
+                self._embedding_cache.move_to_end(key)
+                return cached
+        
+        # Unit length, so a dot product against the collection is the cosine similarity
+        embedding = self.encoder.encode(text, normalize_embeddings=True)
+        # The cached array is handed to every caller with the same text, so make it
+        # read-only rather than copying it on each hit
+        embedding.setflags(write=False)
+        
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+            if len(self._embedding_cache) > self._embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        return embedding
     
     def _create_collection_if_not_exists(self):
         """Create the vector collection if it doesn't exist."""
@@ -68,63 +143,150 @@ class VectorStore:
                     collection_name=self.collection_name,
                     vectors_config=models.VectorParams(
                         size=self.encoder.get_sentence_embedding_dimension(),
-                        distance=models.Distance.COSINE
+                        # Embeddings are L2-normalized on encode, where dot product equals
+                        # cosine without re-deriving norms per comparison
+                        distance=models.Distance.DOT,
+                        datatype=models.Datatype.FLOAT16,  # stored vectors at half the bytes of float32
+                        on_disk=True  # full-precision vectors are mmapped; scoring uses the int8 copy
+                    ),
+                    # HNSW graph and payloads live on disk too, leaving RAM for the int8 copy below
+                    hnsw_config=models.HnswConfigDiff(m=16, ef_construct=100, on_disk=True),
+                    on_disk_payload=True,
+                    # int8 copy of the vectors kept in RAM for scoring (1 byte/dim)
+                    quantization_config=models.ScalarQuantization(
+                        scalar=models.ScalarQuantizationConfig(
+                            type=models.ScalarType.INT8,
+                            quantile=0.99,
+                            always_ram=True
+                        )
                     )
                 )
         except Exception as e:
-            print(f"⚠️ WARNING: Could not create collection: {e}")
+            logger.warning("Could not create collection: %s", e)
     
-    def add_documents(self, texts: List[str], metadata: List[Dict[str, Any]] = None):
-        """Add documents to the vector store."""
+    def encode_documents(self, texts: List[str], cache_dir: Optional[str] = None) -> np.ndarray:
+        """Encode texts in batches into a float16 matrix.
+        
+        Embeddings are L2-normalized and stored at half precision, matching the
+        collection's FLOAT16 datatype. With ``cache_dir``, each embedding is saved as
+        ``<sha256(model, text)>.npy`` and texts seen by an earlier run are loaded from
+        there instead of re-encoded.
+        """
+        if not cache_dir or not texts:
+            return self._encode_batch(texts).astype(np.float16)
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        paths = [
+            os.path.join(cache_dir, hashlib.sha256(f"{self.embedding_model}\0normalized\0{text}".encode("utf-8")).hexdigest() + ".npy")
+            for text in texts
+        ]
+        embeddings: List[Optional[np.ndarray]] = []
+        for path in paths:
+            try:
+                embeddings.append(np.load(path))
+            except (OSError, ValueError):
+                embeddings.append(None)
+        
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            fresh = self._encode_batch([texts[i] for i in misses]).astype(np.float16)
+            for i, embedding in zip(misses, fresh):
+                np.save(paths[i], embedding)
+                embeddings[i] = embedding
+        logger.info("Encoded %d of %d documents (%d from cache)", len(misses), len(texts), len(texts) - len(misses))
+        # Files cached by earlier runs may still be float32
+        return np.stack(embeddings).astype(np.float16, copy=False)
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        # encode() sorts the texts by length and batches neighbours together, so each
+        # batch is padded only to similar lengths; the embeddings come back in input order.
+        return self.encoder.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    
+    def add_documents(
+        self,
+        texts: List[str],
+        metadata: List[Dict[str, Any]] = None,
+        embedding_cache_dir: Optional[str] = None
+    ):
+        """Add documents to the vector store.
+        
+        ``embedding_cache_dir`` is passed to ``encode_documents`` so reloading an
+        unchanged knowledge base skips the encoder.
+        """
         if not self.client:
-            print("⚠️ Qdrant not available, cannot add documents")
+            logger.warning("Qdrant not available, cannot add documents")
             return
         
         if metadata is None:
             metadata = [{} for _ in texts]
         
         try:
-            # Generate embeddings
-            embeddings = self.encoder.encode(texts)
-            
-            # Prepare points for insertion
-            points = [
-                models.PointStruct(
-                    id=i,
-                    vector=embedding.tolist(),
-                    payload={"text": text, **meta}
-                )
-                for i, (text, embedding, meta) in enumerate(zip(texts, embeddings, metadata))
-            ]
+            embeddings = self.encode_documents(texts, cache_dir=embedding_cache_dir)
             
-            # Upload to Qdrant
-            self.client.upsert(
+            # Upload the embedding matrix as-is in batches; the client slices the
+            # ndarray per batch instead of boxing every dimension into a PointStruct.
+            # Ids and payloads are streamed, so only one batch of them exists at a time.
+            self.client.upload_collection(
                 collection_name=self.collection_name,
-                points=points
+                vectors=embeddings,
+                payload=({"text": text, **meta} for text, meta in zip(texts, metadata)),
+                # Ids are derived from the text: re-adding an unchanged document is an
+                # idempotent upsert, and different documents never overwrite each other
+                ids=(str(uuid.uuid5(uuid.NAMESPACE_URL, text)) for text in texts),
+                batch_size=256,
+                wait=True
             )
         except Exception as e:
-            print(f"⚠️ WARNING: Could not add documents to Qdrant: {e}")
+            logger.warning("Could not add documents to Qdrant: %s", e)
     
     def semantic_search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Perform semantic search using the query."""
         if not self.client:
-            print("⚠️ Qdrant not available, returning empty search results")
+            logger.debug("Qdrant not available, returning empty search results")
+            return []
+        
+        try:
+            query_vector = self.embed(query)
+        except Exception as e:
+            logger.warning("Semantic search failed: %s", e)
+            return []
+        return self.semantic_search_by_vector(query_vector, limit=limit)
+    
+    def semantic_search_by_vector(self, query_vector: np.ndarray, limit: int = 5) -> List[Dict[str, Any]]:
+        """Perform semantic search with an already-encoded query."""
+        if not self.client:
+            logger.debug("Qdrant not available, returning empty search results")
             return []
         
         try:
-            query_vector = self.encoder.encode(query)
-            
             # Search in Qdrant
             search_result = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_vector,
-                limit=limit
+                limit=limit,
+                # Candidates are scored on the int8 copy; the top 2*limit are rescored
+                # against the full-precision vectors before the final cut
+                search_params=models.SearchParams(
+                    hnsw_ef=128,
+                    quantization=models.QuantizationSearchParams(
+                        ignore=False,
+                        rescore=True,
+                        oversampling=2.0
+                    )
+                )
             )
             
             # Format results
             results = []
             for scored_point in search_result:
                 results.append({
+                    "id": str(scored_point.id),
                     "text": scored_point.payload["text"],
                     "score": scored_point.score,
                     "metadata": {k: v for k, v in scored_point.payload.items() if k != "text"}
@@ -132,5 +294,5 @@ class VectorStore:
             
             return results
         except Exception as e:
-            print(f"⚠️ WARNING: Semantic search failed: {e}")
+            logger.warning("Semantic search failed: %s", e)
             return []
@@ -14,6 +14,7 @@ export const ChatWindow: React.FC = () => {
     isLoading,
     error,
     addMessage,
+    updateLastMessage,
     setLoading,
     setError,
     loadConversations,
@@ -62,11 +63,22 @@ export const ChatWindow: React.FC = () => {
           return acc;
         }, []);
 
-      // Send message to API
-      const response = await api.chat.sendMessage(
+      // Stream the answer into an assistant message as tokens arrive
+      let streamedText = '';
+      const response = await api.chat.streamMessage(
         content,
         currentConversationId || undefined,
-        chatHistory
+        chatHistory,
+        (delta) => {
+          if (!streamedText) {
+            // First token - replace the typing indicator with the message
+            addMessage({ role: 'assistant', content: delta, timestamp: new Date().toISOString() });
+            setLoading(false);
+          } else {
+            updateLastMessage({ content: streamedText + delta });
+          }
+          streamedText += delta;
+        }
       );
 
       // Update conversation ID if this is a new conversation
@@ -77,7 +89,7 @@ export const ChatWindow: React.FC = () => {
       // Reload conversations after sending message to update the sidebar
       await loadConversations();
 
-      // Add assistant message with sources
+      // Attach the final text and sources to the assistant message
       console.log('📋 ChatWindow: Received response with sources:', {
         sourcesCount: response.sources?.length || 0,
         sources: response.sources,
@@ -100,7 +112,12 @@ export const ChatWindow: React.FC = () => {
         sources: assistantMessage.metadata?.sources,
       });
       
-      addMessage(assistantMessage);
+      if (streamedText) {
+        updateLastMessage(assistantMessage);
+      } else {
+        // Cached or error responses arrive as a single final event
+        addMessage(assistantMessage);
+      }
     } catch (err) {
       setError(
         err instanceof Error ? err.message : 'An error occurred while sending message'
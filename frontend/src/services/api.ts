@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { ChatResponse } from '@/types/chat';
 
 const API_BASE_URL = 'http://127.0.0.1:8000/api';
 
@@ -13,6 +14,53 @@ export const api = {
       });
       return response.data;
     },
+
+    // Streams the answer over SSE: onDelta gets each text chunk as it arrives,
+    // and the promise resolves with the final event (same shape as /chat).
+    streamMessage: async (
+      message: string,
+      conversationId: string | undefined,
+      chatHistory: any[] = [],
+      onDelta: (delta: string) => void
+    ): Promise<ChatResponse> => {
+      const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message,
+          conversation_id: conversationId,
+          chat_history: chatHistory,
+        }),
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const line = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+          if (!line.startsWith('data: ')) continue;
+
+          const event = JSON.parse(line.slice(6));
+          if (event.done) {
+            return event as ChatResponse;
+          }
+          onDelta(event.delta);
+        }
+      }
+      throw new Error('Stream ended before the response was complete');
+    },
   },
 
   // Conversations
@@ -15,6 +15,14 @@ export const useChatStore = create<ChatState>((set, get) => ({
       messages: [...state.messages, { ...message, timestamp: message.timestamp || new Date().toISOString() }],
     })),
 
+  updateLastMessage: (update: Partial<Message>) =>
+    set((state) => {
+      if (state.messages.length === 0) return {};
+      const messages = state.messages.slice();
+      messages[messages.length - 1] = { ...messages[messages.length - 1], ...update };
+      return { messages };
+    }),
+
   setLoading: (loading: boolean) => set({ isLoading: loading }),
 
   setError: (error: string | null) => set({ error }),
@@ -60,7 +60,7 @@ export interface ChatResponse {
   }>;
   metadata: {
     model: string;
-    total_tokens: number;
+    total_tokens: number | null; // not reported for streamed responses
     rag_documents_used?: number;
     top_match_score?: number;
     web_search_used?: boolean;
@@ -77,6 +77,7 @@ export interface ChatState {
   conversationsLoading: boolean;
   error: string | null;
   addMessage: (message: Message) => void;
+  updateLastMessage: (update: Partial<Message>) => void;
   setLoading: (loading: boolean) => void;
   setError: (error: string | null) => void;
   clearMessages: () => void;
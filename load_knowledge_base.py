@@ -1,6 +1,22 @@
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from app.services.vector_store import VectorStore
 
+
+# Embeddings from earlier runs, reused for unchanged documents
+EMBEDDING_CACHE_DIR = ".embed_cache"
+
+
+def _read_text_file(path):
+    """Read a knowledge base file, returning ``(content, error)``."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read().strip(), None
+    except Exception as e:
+        return None, e
+
+
 def load_text_files_from_directory(directory_path):
     """Load all text files from a directory and return them as documents."""
     documents = []
@@ -10,44 +26,52 @@ def load_text_files_from_directory(directory_path):
         os.makedirs(directory_path, exist_ok=True)
         return documents
     
-    for filename in os.listdir(directory_path):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(directory_path, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read().strip()
-                    if content:  # Only add non-empty files
-                        # Extract topic from filename
-                        topic = filename.replace('.txt', '').replace('_', ' ').title()
-                        documents.append({
-                            "text": content,
-                            "metadata": {
-                                "source": "knowledge_base",
-                                "filename": filename,
-                                "topic": topic,
-                                "category": get_category_from_filename(filename)
-                            }
-                        })
-                        print(f"✅ Loaded: {filename}")
-            except Exception as e:
-                print(f"❌ Error loading {filename}: {str(e)}")
+    with os.scandir(directory_path) as entries:
+        text_files = [entry for entry in entries if entry.name.endswith('.txt') and entry.is_file()]
+    
+    # Read the files concurrently; map() keeps the directory order for the output
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = pool.map(_read_text_file, [entry.path for entry in text_files])
+        for entry, (content, error) in zip(text_files, results):
+            filename = entry.name
+            if error is not None:
+                print(f"❌ Error loading {filename}: {str(error)}")
+            elif content:  # Only add non-empty files
+                # Extract topic from filename
+                topic = filename.replace('.txt', '').replace('_', ' ').title()
+                documents.append({
+                    "text": content,
+                    "metadata": {
+                        "source": "knowledge_base",
+                        "filename": filename,
+                        "topic": topic,
+                        "category": get_category_from_filename(filename)
+                    }
+                })
+                print(f"✅ Loaded: {filename}")
     
     return documents
 
+# Keyword patterns per category, checked in order. A keyword must start a word
+# ("ai_ethics", "biotechnology") so "ai" no longer matches inside "sustainable".
+_CATEGORY_PATTERNS = [
+    (category, re.compile(r"(?<![a-z])(?:" + "|".join(words) + ")"))
+    for category, words in [
+        ("Technology", ['ai', 'artificial', 'machine', 'data', 'quantum', 'blockchain']),
+        ("Science", ['biotech', 'renewable', 'space', 'climate']),
+        ("Business", ['digital', 'startup', 'sustainable', 'fintech', 'remote']),
+        ("Health", ['telemedicine', 'precision', 'mental', 'public', 'healthcare']),
+    ]
+]
+
 def get_category_from_filename(filename):
     """Determine category based on filename."""
     filename_lower = filename.lower()
     
-    if any(word in filename_lower for word in ['ai', 'artificial', 'machine', 'data', 'quantum', 'blockchain']):
-        return "Technology"
-    elif any(word in filename_lower for word in ['biotech', 'renewable', 'space', 'climate']):
-        return "Science"
-    elif any(word in filename_lower for word in ['digital', 'startup', 'sustainable', 'fintech', 'remote']):
-        return "Business"
-    elif any(word in filename_lower for word in ['telemedicine', 'precision', 'mental', 'public', 'healthcare']):
-        return "Health"
-    else:
-        return "General"
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(filename_lower):
+            return category
+    return "General"
 
 def main():
     # Initialize the vector store
@@ -83,24 +107,28 @@ def main():
         }
     ]
     
-    # Add original documents
-    for doc in original_documents:
-        vector_store.add_documents([doc["text"]], [doc["metadata"]])
-        print(f"✅ Added original: {doc['metadata']['topic']}")
-    
-    # Load and add knowledge base files
+    # Load knowledge base files
     print("\n📁 Loading knowledge base files...")
     knowledge_base_path = "knowledge_base"
     knowledge_documents = load_text_files_from_directory(knowledge_base_path)
     
-    if knowledge_documents:
-        print(f"\n📖 Adding {len(knowledge_documents)} knowledge base documents...")
-        for doc in knowledge_documents:
-            vector_store.add_documents([doc["text"]], [doc["metadata"]])
-            print(f"✅ Added KB: {doc['metadata']['topic']} ({doc['metadata']['category']})")
-    else:
+    if not knowledge_documents:
         print("⚠️ No knowledge base files found. Please ensure the knowledge_base directory exists with .txt files.")
     
+    # Encode and upsert everything in one batch: one batched forward pass and one
+    # Qdrant round-trip instead of one of each per document
+    all_documents = original_documents + knowledge_documents
+    print(f"\n📖 Adding {len(all_documents)} documents...")
+    vector_store.add_documents(
+        [doc["text"] for doc in all_documents],
+        [doc["metadata"] for doc in all_documents],
+        embedding_cache_dir=EMBEDDING_CACHE_DIR
+    )
+    for doc in original_documents:
+        print(f"✅ Added original: {doc['metadata']['topic']}")
+    for doc in knowledge_documents:
+        print(f"✅ Added KB: {doc['metadata']['topic']} ({doc['metadata']['category']})")
+    
     # Summary
     total_docs = len(original_documents) + len(knowledge_documents)
     print(f"\n🎉 Successfully added {total_docs} documents to the vector store!")
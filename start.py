@@ -19,24 +19,20 @@ os.environ['PYTHONPATH'] = script_dir + os.pathsep + os.environ.get('PYTHONPATH'
 if __name__ == "__main__":
     import uvicorn
     
-    # Verify we can import the app
+    # Check the app module can be found without importing it: importing app.main here
+    # would load the whole application and its dependencies only to throw them away,
+    # since the reloader imports the app again in its own worker process
     try:
-        from app.main import app
+        import importlib.util
+        if importlib.util.find_spec("app.main") is None:
+            raise ImportError("No module named 'app.main'")
         print(f"Starting server from: {os.getcwd()}")
         print("Server will be available at: http://localhost:8000")
         print("API docs: http://localhost:8000/docs")
         print("\nPress Ctrl+C to stop the server\n")
         
-        # For reload to work, we need to pass the app as an import string
-        # But we also need to ensure PYTHONPATH is set for the subprocess
-        # So we'll use uvicorn's CLI interface with proper environment
-        import subprocess
-        
-        # Set environment for subprocess
-        env = os.environ.copy()
-        env['PYTHONPATH'] = script_dir + os.pathsep + env.get('PYTHONPATH', '')
-        
-        # Run uvicorn as subprocess with import string
+        # For reload to work, the app must be passed as an import string; the
+        # PYTHONPATH set above is inherited by the reloader's worker process
         uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True, env_file=None)
     except ImportError as e:
         print(f"ERROR: Cannot import app module: {e}")